@@ -5,6 +5,7 @@ import 'package:image_picker/image_picker.dart';
 import 'package:permission_handler/permission_handler.dart';
 import 'package:tflite_flutter/tflite_flutter.dart';
 import 'package:image/image.dart' as img; // Rename to avoid conflict with Flutter Image widget
+import '../services/pneumonia_input.dart';
 
 class OnDeviceScreen extends StatefulWidget {
   const OnDeviceScreen({super.key});
@@ -20,6 +21,7 @@ class _OnDeviceScreenState extends State<OnDeviceScreen> {
   bool _isLoading = false;
   
   Interpreter? _interpreter;
+  PneumoniaInput _inputSpec = PneumoniaInput.legacy;
   final ImagePicker _picker = ImagePicker();
 
   @override
@@ -45,6 +47,7 @@ class _OnDeviceScreenState extends State<OnDeviceScreen> {
   Future<void> _loadModel() async {
     try {
       _interpreter = await Interpreter.fromAsset('assets/pneumonia_model.tflite');
+      _inputSpec = await PneumoniaInput.load();
       print("Model Loaded Successfully");
     } catch (e) {
       print("Error loading model: $e");
@@ -73,30 +76,40 @@ class _OnDeviceScreenState extends State<OnDeviceScreen> {
     setState(() => _isLoading = true);
 
     // A. Preprocess Image (Resize to 224x224 & Normalize)
-    // Note: This must match your Python training preprocessing (1./255)
+    // Note: The pixel scaling comes from assets/pneumonia_input.json, written with the model
     var imageBytes = await imageFile.readAsBytes();
     var decodedImage = img.decodeImage(imageBytes);
     var resizedImage = img.copyResize(decodedImage!, width: 224, height: 224);
 
-    // Convert to Float32 List [1, 224, 224, 3]
+    // Full-int8 models (fix_and_convert.py) take quantized int8 pixels; float models take the scaled floats
+    final inputTensor = _interpreter!.getInputTensor(0);
+    final outputTensor = _interpreter!.getOutputTensor(0);
+    final bool isInt8 = inputTensor.type == TensorType.int8;
+    num toInput(num v) => isInt8
+        ? (v / inputTensor.params.scale + inputTensor.params.zeroPoint).round().clamp(-128, 127)
+        : v;
+
+    // Convert to List [1, 224, 224, 3]
     var input = List.generate(1, (i) => List.generate(224, (y) => List.generate(224, (x) {
       var pixel = resizedImage.getPixel(x, y);
       return [
-        pixel.r / 255.0, // Normalize 0-1
-        pixel.g / 255.0,
-        pixel.b / 255.0
+        toInput(_inputSpec.apply(pixel.r)),
+        toInput(_inputSpec.apply(pixel.g)),
+        toInput(_inputSpec.apply(pixel.b))
       ];
     })));
 
     // B. Setup Output
     // Output shape [1, 1] for binary classification (Sigmoid)
-    var output = List.filled(1 * 1, 0.0).reshape([1, 1]);
+    var output = List.filled(1 * 1, isInt8 ? 0 : 0.0).reshape([1, 1]);
 
     // C. Run Interpreter
     _interpreter!.run(input, output);
 
     // D. Interpret Results
-    double score = output[0][0];
+    double score = isInt8
+        ? (output[0][0] - outputTensor.params.zeroPoint) * outputTensor.params.scale
+        : output[0][0];
     bool isPneumonia = score > 0.5;
     
     // Calculate display confidence (0.5 to 1.0 -> 50% to 100%)
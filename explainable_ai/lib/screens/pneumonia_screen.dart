@@ -8,6 +8,7 @@ import 'package:image_picker/image_picker.dart';
 import 'package:tflite_flutter/tflite_flutter.dart';
 import 'package:image/image.dart' as img;
 import '../services/heatmap_helper.dart';
+import '../services/pneumonia_input.dart';
 import '../services/firebase_service.dart';
 import '../services/database_helper.dart';
 
@@ -25,6 +26,7 @@ class _PneumoniaScreenState extends State<PneumoniaScreen> {
   
   Interpreter? _interpreter;
   List<double>? _denseWeights;
+  PneumoniaInput _inputSpec = PneumoniaInput.legacy;
   
   final FirebaseService _db = FirebaseService();
   final DatabaseHelper _localDb = DatabaseHelper();
@@ -44,11 +46,24 @@ class _PneumoniaScreenState extends State<PneumoniaScreen> {
     try {
       // 1. Load Multi-Output Model
       _interpreter = await Interpreter.fromAsset('assets/pneumonia_xai_model.tflite');
+      _inputSpec = await PneumoniaInput.load();
       
-      // 2. Load Weights JSON
-      String jsonString = await rootBundle.loadString('assets/pneumonia_weights.json');
-      var jsonData = json.decode(jsonString);
-      _denseWeights = List<double>.from(jsonData['weights']);
+      // 2. Load Weights: binary blob (float32 LE scale + int8 per channel), JSON as fallback
+      try {
+        ByteData data = await rootBundle.load('assets/pneumonia_weights.bin');
+        double scale = data.getFloat32(0, Endian.little);
+        Int8List weightsI8 = data.buffer.asInt8List(data.offsetInBytes + 4, data.lengthInBytes - 4);
+        _denseWeights = [for (var q in weightsI8) q * scale];
+      } catch (_) {
+        String jsonString = await rootBundle.loadString('assets/pneumonia_weights.json');
+        var jsonData = json.decode(jsonString);
+        if (jsonData.containsKey('weights_i8')) {
+          double scale = (jsonData['scale'] as num).toDouble();
+          _denseWeights = [for (var q in jsonData['weights_i8']) (q as num) * scale];
+        } else {
+          _denseWeights = List<double>.from(jsonData['weights']);
+        }
+      }
       
       print("✅ Offline XAI System Ready. Weights loaded: ${_denseWeights?.length}");
     } catch (e) {
@@ -69,35 +84,44 @@ class _PneumoniaScreenState extends State<PneumoniaScreen> {
 
       var input = List.generate(1, (i) => List.generate(224, (y) => List.generate(224, (x) {
         var p = resized.getPixel(x, y);
-        return [p.r / 255.0, p.g / 255.0, p.b / 255.0];
+        // Scaling from assets/pneumonia_input.json, written with the model
+        return [_inputSpec.apply(p.r), _inputSpec.apply(p.g), _inputSpec.apply(p.b)];
       })));
 
-      // --- B. Prepare Outputs ---
-      // Get Output Tensor Shapes dynamically
+      // --- B/C. Run Inference ---
+      double risk;
+      List<double> flatFeatures;
       var outputTensors = _interpreter!.getOutputTensors();
-      var shape0 = outputTensors[0].shape; // Prediction [1, 1]
-      var shape1 = outputTensors[1].shape; // Features [1, 7, 7, 1280] or similar
 
-      var outputPred = List.filled(shape0.reduce((a, b) => a * b), 0.0).reshape(shape0);
-      var outputFeatures = List.filled(shape1.reduce((a, b) => a * b), 0.0).reshape(shape1);
+      if (outputTensors.length == 1) {
+        // Fused export: [1, H*W*C + 1] = flattened feature map, then the prediction
+        int total = outputTensors[0].shape.reduce((a, b) => a * b);
+        var output = List.filled(total, 0.0).reshape([1, total]);
+        _interpreter!.run(input, output);
 
-      var outputs = {0: outputPred, 1: outputFeatures};
+        List<double> flat = (output[0] as List).cast<double>();
+        risk = flat[total - 1];
+        flatFeatures = flat.sublist(0, total - 1);
+      } else {
+        // Older two-output export: Prediction [1, 1] and Features [1, 7, 7, 1280]
+        var shape0 = outputTensors[0].shape;
+        var shape1 = outputTensors[1].shape;
 
-      // --- C. Run Inference ---
-      _interpreter!.runForMultipleInputs([input], outputs);
+        var outputPred = List.filled(shape0.reduce((a, b) => a * b), 0.0).reshape(shape0);
+        var outputFeatures = List.filled(shape1.reduce((a, b) => a * b), 0.0).reshape(shape1);
 
-      // --- D. Process Results ---
-      double risk = outputPred[0][0];
+        _interpreter!.runForMultipleInputs([input], {0: outputPred, 1: outputFeatures});
+
+        risk = outputPred[0][0];
+        flatFeatures = (outputFeatures[0] as List)
+            .expand((row) => (row as List).expand((col) => (col as List<double>)))
+            .toList()
+            .cast<double>();
+      }
       
       // --- E. Generate Heatmap ---
       Uint8List? heatmapBytes;
       if (risk > 0.3) { 
-        // Flatten features
-        List<double> flatFeatures = (outputFeatures[0] as List)
-            .expand((row) => (row as List).expand((col) => (col as List<double>)))
-            .toList()
-            .cast<double>();
-
         // DYNAMIC CALCULATION (Fixes the crash)
         int channels = _denseWeights!.length; // Use actual weights length (e.g., 128)
         int totalFeatures = flatFeatures.length;
@@ -0,0 +1,27 @@
+import 'dart:convert';
+import 'package:flutter/services.dart' show rootBundle;
+
+/// Pixel transform expected by the bundled pneumonia models: input = pixel * scale + offset.
+///
+/// Written next to each export by python/pneumonia_input.py. Models with an
+/// in-graph Rescaling layer take raw 0-255 pixels (scale 1); older exports
+/// were trained on 0-1 inputs (scale 1/255), which is also the fallback.
+class PneumoniaInput {
+  final double scale;
+  final double offset;
+
+  const PneumoniaInput(this.scale, this.offset);
+
+  static const PneumoniaInput legacy = PneumoniaInput(1 / 255.0, 0.0);
+
+  static Future<PneumoniaInput> load() async {
+    try {
+      var spec = json.decode(await rootBundle.loadString('assets/pneumonia_input.json'));
+      return PneumoniaInput((spec['scale'] as num).toDouble(), (spec['offset'] as num).toDouble());
+    } catch (_) {
+      return legacy;
+    }
+  }
+
+  double apply(num pixel) => pixel * scale + offset;
+}
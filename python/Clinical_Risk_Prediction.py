@@ -1,58 +1,105 @@
+import os
+
+# --- CPU: route Dense/BN through oneDNN's fused AVX-512 / AMX kernels ---
+# Must be set before TensorFlow is imported (on by default since TF 2.9).
+os.environ['TF_ENABLE_ONEDNN_OPTS'] = '1'
+os.environ.setdefault('ONEDNN_MAX_CPU_ISA', 'AVX512_CORE_AMX')
+
 import pandas as pd
 import numpy as np
 import tensorflow as tf
-import json
-import os
+import orjson
 from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.utils.class_weight import compute_class_weight
+from sklearn.preprocessing import StandardScaler
 import warnings
 
+tf.config.threading.set_intra_op_parallelism_threads(os.cpu_count())
+tf.config.threading.set_inter_op_parallelism_threads(2)
+# ------------------------------------------------------------------------
+
 warnings.filterwarnings('ignore')
 
+def cpu_has_native_bf16():
+    """True if the CPU advertises bf16 matmul instructions (AVX512-BF16 or AMX-BF16).
+
+    ONEDNN_MAX_CPU_ISA above only caps the ISA oneDNN may use; it says nothing about
+    the host. Reads /proc/cpuinfo, so other platforms report False.
+    """
+    try:
+        with open('/proc/cpuinfo') as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return 'avx512_bf16' in flags or 'amx_bf16' in flags
+
+# Mixed precision: matmul/BN compute in half precision, variables stay float32.
+# float16 needs GPU Tensor Cores; bfloat16 only pays off on CPUs with native bf16 support
+# (elsewhere it is emulated and slower than float32, also under XLA), so other hosts stay float32.
+if tf.config.list_physical_devices('GPU'):
+    MIXED_PRECISION_POLICY = 'mixed_float16'
+elif cpu_has_native_bf16():
+    MIXED_PRECISION_POLICY = 'mixed_bfloat16'
+else:
+    MIXED_PRECISION_POLICY = 'float32'
+tf.keras.mixed_precision.set_global_policy(MIXED_PRECISION_POLICY)
+
 # Ensure output directories exist
 os.makedirs('assets', exist_ok=True)
 os.makedirs('models', exist_ok=True)
 
+def write_json(path, data):
+    """Pretty-printed JSON via orjson (serializes NumPy arrays and scalars directly)"""
+    with open(path, 'wb') as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+
 def preprocess_and_encode(df, dataset_name):
     """Enhanced preprocessing with better handling of categorical variables"""
     print(f"\n🔹 Preprocessing {dataset_name}...")
     
-    # 1. DROP USELESS COLUMNS
+    # Columns are collected as NumPy arrays and the frame is built once at the end
+    out = {}
+    
+    # 1. DROP USELESS COLUMNS (by exclusion)
     drop_cols = ['id', 'dataset']
     for col in drop_cols:
         if col in df.columns:
-            df = df.drop(col, axis=1)
             print(f"   Dropped column: {col}")
+    columns = [col for col in df.columns if col not in drop_cols]
 
     # 2. HANDLE TEXT COLUMNS (Encoding)
     mappings = {}
     
-    for col in df.columns:
+    for col in columns:
         if df[col].dtype == 'object' or df[col].dtype.name == 'category':
-            le = LabelEncoder()
-            df[col] = le.fit_transform(df[col].astype(str))
+            # Categorical factorization: sorted categories, same codes as LabelEncoder.
+            # Codes come back as int8 (int16 past 127 categories).
+            cat = df[col].astype(str).astype('category')
+            out[col] = cat.cat.codes.to_numpy()
             
-            mapping_dict = dict(zip(le.classes_, le.transform(le.classes_)))
-            mappings[col] = {str(k): int(v) for k, v in mapping_dict.items()}
+            mappings[col] = {str(k): i for i, k in enumerate(cat.cat.categories)}
             print(f"   Encoded '{col}': {mappings[col]}")
+        else:
+            out[col] = df[col].to_numpy()
     
-    # 3. Handle outliers using IQR method
-    numeric_cols = df.select_dtypes(include=[np.number]).columns
-    for col in numeric_cols:
-        Q1 = df[col].quantile(0.25)
-        Q3 = df[col].quantile(0.75)
+    # 3. Handle outliers using IQR method (all columns in one vectorized pass).
+    # Encoded columns are skipped: clipping category codes would make them
+    # fractional and no longer match the saved mappings.
+    numeric_cols = [col for col in columns
+                    if col not in mappings and np.issubdtype(out[col].dtype, np.number)]
+    if numeric_cols:
+        arr = np.stack([out[col] for col in numeric_cols], axis=1, dtype=np.float64)
+        Q1, Q3 = np.quantile(arr, [0.25, 0.75], axis=0)
         IQR = Q3 - Q1
-        lower_bound = Q1 - 1.5 * IQR
-        upper_bound = Q3 + 1.5 * IQR
-        df[col] = df[col].clip(lower=lower_bound, upper=upper_bound)
+        np.clip(arr, Q1 - 1.5 * IQR, Q3 + 1.5 * IQR, out=arr)
+        arr = arr.astype(np.float32)
+        for i, col in enumerate(numeric_cols):
+            out[col] = arr[:, i]
     
     # Save mappings
     if mappings:
-        with open(f'assets/{dataset_name.lower()}_mappings.json', 'w') as f:
-            json.dump(mappings, f, indent=2)
+        write_json(f'assets/{dataset_name.lower()}_mappings.json', mappings)
             
-    return df
+    return pd.DataFrame(out, index=df.index)
 
 def create_optimized_model(input_dim, learning_rate=0.001):
     """Create an optimized neural network"""
@@ -78,11 +125,14 @@ def create_optimized_model(input_dim, learning_rate=0.001):
         tf.keras.layers.Activation('relu'),
         tf.keras.layers.Dropout(0.2),
         
-        # Output layer
-        tf.keras.layers.Dense(1, activation='sigmoid')
+        # Output layer (kept in float32 for a numerically stable sigmoid)
+        tf.keras.layers.Dense(1, activation='sigmoid', dtype='float32')
     ])
     
     optimizer = tf.keras.optimizers.Adam(learning_rate=learning_rate)
+    if MIXED_PRECISION_POLICY == 'mixed_float16':
+        # Dynamic loss scaling prevents float16 gradient underflow
+        optimizer = tf.keras.mixed_precision.LossScaleOptimizer(optimizer)
     
     model.compile(
         optimizer=optimizer,
@@ -92,7 +142,9 @@ def create_optimized_model(input_dim, learning_rate=0.001):
             tf.keras.metrics.AUC(name='auc'),
             tf.keras.metrics.Precision(name='precision'),
             tf.keras.metrics.Recall(name='recall')
-        ]
+        ],
+        # XLA fuses each Dense -> BN -> ReLU block into a few kernels
+        jit_compile=True
     )
     
     return model
@@ -129,6 +181,7 @@ def train_model(dataset_name, csv_filename, target_col):
     
     X = df.drop(target_col, axis=1)
     y = df[target_col]
+    feature_names = list(X.columns)
     
     # Check class balance
     print(f"\nClass Distribution:")
@@ -140,33 +193,27 @@ def train_model(dataset_name, csv_filename, target_col):
         X, y, test_size=0.2, random_state=42, stratify=y
     )
 
-    # 5. Scaling (Standardization)
+    # 5. Scaling (Standardization) - StandardScaler keeps float32 input in float32
+    X_train = X_train.to_numpy(dtype=np.float32)
+    X_test = X_test.to_numpy(dtype=np.float32)
     scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
+    # Guarantee float32 for the model input (no copy when the scaler already returns float32)
+    X_train_scaled = scaler.fit_transform(X_train).astype(np.float32, copy=False)
+    X_test_scaled = scaler.transform(X_test).astype(np.float32, copy=False)
+    y_train_arr = y_train.to_numpy(dtype=np.float32)
+    y_test_arr = y_test.to_numpy(dtype=np.float32)
 
     # Save Scaler Params
     scaler_params = {
-        "mean": scaler.mean_.tolist(),
-        "std": scaler.scale_.tolist(),
-        "feature_names": list(X.columns)
+        "mean": scaler.mean_,
+        "std": scaler.scale_,
+        "feature_names": feature_names
     }
     
-    with open(f'assets/{dataset_name.lower()}_scaler.json', 'w') as f:
-        json.dump(scaler_params, f, indent=2)
+    write_json(f'assets/{dataset_name.lower()}_scaler.json', scaler_params)
     print(f"✅ Saved Normalization Data")
 
-    # 6. Calculate class weights (capped to prevent extreme values)
-    class_weights_array = compute_class_weight(
-        'balanced',
-        classes=np.unique(y_train),
-        y=y_train
-    )
-    
-    max_weight = 3.0
-    class_weights_array = np.clip(class_weights_array, 0.5, max_weight)
-    class_weights = dict(enumerate(class_weights_array))
-    print(f"\nClass Weights (capped): {class_weights}")
+    # 6. Class balance is handled in the input pipeline (balanced sampling, see step 8)
 
     # 7. Build Neural Network
     model = create_optimized_model(input_dim=X_train.shape[1])
@@ -192,19 +239,42 @@ def train_model(dataset_name, csv_filename, target_col):
         verbose=1
     )
     
+    # Input pipeline: the tabular data fits in memory, so cache it once and
+    # prefetch batches so host-side slicing overlaps with the training step.
+    # Hold out the last 20% for validation, same as validation_split=0.2.
+    n_val = int(len(X_train_scaled) * 0.2)
+    n_fit = len(X_train_scaled) - n_val
+    fit_ds = tf.data.Dataset.from_tensor_slices((X_train_scaled[:n_fit], y_train_arr[:n_fit])).cache()
+    
+    # Balanced sampling: draw positives and negatives 50/50 instead of
+    # reweighting every per-sample loss with class_weight
+    ds_pos = fit_ds.filter(lambda x, y: y > 0.5).repeat().shuffle(n_fit, seed=42)
+    ds_neg = fit_ds.filter(lambda x, y: y <= 0.5).repeat().shuffle(n_fit, seed=42)
+    train_ds = (
+        tf.data.Dataset.sample_from_datasets([ds_pos, ds_neg], weights=[0.5, 0.5], seed=42)
+        .batch(32)
+        .prefetch(tf.data.AUTOTUNE)
+    )
+    steps_per_epoch = max(1, n_fit // 32)
+    val_ds = (
+        tf.data.Dataset.from_tensor_slices((X_train_scaled[n_fit:], y_train_arr[n_fit:]))
+        .batch(32)
+        .cache()
+        .prefetch(tf.data.AUTOTUNE)
+    )
+    
     history = model.fit(
-        X_train_scaled, y_train,
-        validation_split=0.2,
+        train_ds,
+        validation_data=val_ds,
         epochs=150,
-        batch_size=32,
-        class_weight=class_weights,
+        steps_per_epoch=steps_per_epoch,
         callbacks=[early_stopping, reduce_lr],
         verbose=1
     )
     
     # 9. Evaluation
     print("\n📊 Model Evaluation:")
-    test_results = model.evaluate(X_test_scaled, y_test, verbose=0)
+    test_results = model.evaluate(X_test_scaled, y_test_arr, verbose=0)
     metrics_names = model.metrics_names
     
     results_dict = {}
@@ -235,12 +305,13 @@ def train_model(dataset_name, csv_filename, target_col):
 
     # 10. Feature Importance
     first_layer_weights = model.layers[0].get_weights()[0]
-    feature_importance = np.abs(first_layer_weights).mean(axis=1)
-    feature_importance = feature_importance / feature_importance.sum()
+    # Row-wise L1 norm; the 1/n of a mean cancels out in the normalization
+    feature_importance = np.abs(first_layer_weights).sum(axis=1)
+    feature_importance /= feature_importance.sum()
     
     importance_dict = {
-        feat: float(imp) 
-        for feat, imp in zip(X.columns, feature_importance)
+        feat: imp
+        for feat, imp in zip(feature_names, feature_importance)
     }
     importance_dict = dict(sorted(importance_dict.items(), key=lambda x: x[1], reverse=True))
     
@@ -248,8 +319,7 @@ def train_model(dataset_name, csv_filename, target_col):
     for i, (feat, imp) in enumerate(list(importance_dict.items())[:5], 1):
         print(f"  {i}. {feat}: {imp*100:.2f}%")
     
-    with open(f'assets/{dataset_name.lower()}_feature_importance.json', 'w') as f:
-        json.dump(importance_dict, f, indent=2)
+    write_json(f'assets/{dataset_name.lower()}_feature_importance.json', importance_dict)
 
     # 11. Save Keras Model
     model.save(f'models/{dataset_name.lower()}_model.keras')
@@ -259,22 +329,21 @@ def train_model(dataset_name, csv_filename, target_col):
     metadata = {
         "model_name": dataset_name,
         "input_shape": X_train.shape[1],
-        "features": list(X.columns),
-        "accuracy": float(results_dict.get('accuracy', 0)),
-        "auc": float(results_dict.get('auc', results_dict.get('auc_1', 0))),
-        "precision": float(precision),
-        "recall": float(recall),
-        "f1_score": float(f1_score),
+        "features": feature_names,
+        "accuracy": results_dict.get('accuracy', 0.0),
+        "auc": results_dict.get('auc', results_dict.get('auc_1', 0.0)),
+        "precision": precision,
+        "recall": recall,
+        "f1_score": f1_score,
         "training_samples": len(X_train),
         "test_samples": len(X_test),
         "class_distribution": {
-            "class_0": int((y==0).sum()),
-            "class_1": int((y==1).sum())
+            "class_0": (y==0).sum(),
+            "class_1": (y==1).sum()
         }
     }
     
-    with open(f'assets/{dataset_name.lower()}_metadata.json', 'w') as f:
-        json.dump(metadata, f, indent=2)
+    write_json(f'assets/{dataset_name.lower()}_metadata.json', metadata)
     
     print(f"✅ Saved Model Metadata")
     
@@ -1,7 +1,21 @@
+import os
+
+# --- CPU: route Dense/BN through oneDNN's fused AVX-512 / AMX kernels ---
+# Must be set before TensorFlow is imported (on by default since TF 2.9).
+os.environ['TF_ENABLE_ONEDNN_OPTS'] = '1'
+os.environ.setdefault('ONEDNN_MAX_CPU_ISA', 'AVX512_CORE_AMX')
+
 import tensorflow as tf
 import numpy as np
-import os
+import pandas as pd
+import hashlib
 import json
+import orjson
+from convert_utils import convert_batchnorm_to_inference, cached_saved_model
+
+tf.config.threading.set_intra_op_parallelism_threads(os.cpu_count())
+tf.config.threading.set_inter_op_parallelism_threads(2)
+# ------------------------------------------------------------------------
 
 def convert_to_tflite(model_name):
     """Convert Keras model to TFLite format with M4 Mac fix"""
@@ -38,16 +52,28 @@ def convert_to_tflite(model_name):
     concrete_func = model_fn.get_concrete_function()
     converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_func])
     
-    # Optimization settings
+    # Optimization settings: full-integer (INT8) weights and activations.
+    # Input/output stay float32 so the Flutter app keeps feeding a normalized Float32List.
     converter.optimizations = [tf.lite.Optimize.DEFAULT]
-    converter.target_spec.supported_types = [tf.float32]
+    converter.representative_dataset = make_representative_dataset(model_name, model.input_shape[-1])
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
     
     # Additional flags for stability
     converter.experimental_new_converter = True
     converter.experimental_new_quantizer = True
     
     try:
-        tflite_model = converter.convert()
+        try:
+            tflite_model = converter.convert()
+            print(f"✅ Applied INT8 post-training quantization")
+        except Exception as e:
+            # FP32 fallback (e.g. the M4 Mac BatchNorm issue)
+            print(f"⚠️  INT8 quantization failed: {e}")
+            print(f"⏳ Falling back to FP32 conversion...")
+            converter.representative_dataset = None
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS]
+            converter.target_spec.supported_types = [tf.float32]
+            tflite_model = converter.convert()
         
         # Save TFLite model
         with open(tflite_path, 'wb') as f:
@@ -65,37 +91,138 @@ def convert_to_tflite(model_name):
         print("\n🔧 Trying alternative conversion method...")
         return try_alternative_conversion(model, tflite_path)
 
-def convert_batchnorm_to_inference(model):
-    """Convert BatchNormalization layers to inference mode (fuse with previous layer)"""
-    
-    # Create a new model with BatchNorm in inference mode
-    def clone_function(layer):
-        config = layer.get_config()
-        if isinstance(layer, tf.keras.layers.BatchNormalization):
-            # Force inference mode
-            config['trainable'] = False
-        return layer.__class__.from_config(config)
-    
-    new_model = tf.keras.models.clone_model(model, clone_function=clone_function)
-    new_model.set_weights(model.get_weights())
-    
-    # Compile with same settings
-    new_model.compile(
-        optimizer='adam',
-        loss='binary_crossentropy',
-        metrics=['accuracy']
+TARGET_COLUMNS = ['target', 'output', 'num', 'Outcome', 'HeartDisease', 'class']
+
+def load_calibration_data(model_name, input_dim, num_samples=100):
+    """Standardized calibration samples (and labels, when available) for quantization"""
+    
+    scaler_path = f'assets/{model_name.lower()}_scaler.json'
+    mappings_path = f'assets/{model_name.lower()}_mappings.json'
+    csv_path = f'{model_name.lower()}.csv'
+    rng = np.random.default_rng(42)
+    
+    if os.path.exists(scaler_path) and os.path.exists(csv_path):
+        with open(scaler_path, 'r') as f:
+            scaler = json.load(f)
+        
+        df = pd.read_csv(csv_path).dropna()
+        if os.path.exists(mappings_path):
+            with open(mappings_path, 'r') as f:
+                mappings = json.load(f)
+            for col, mapping in mappings.items():
+                df[col] = df[col].astype(str).map(mapping)
+        
+        idx = rng.permutation(len(df))[:num_samples]
+        mean = np.array(scaler['mean'], dtype=np.float32)
+        std = np.array(scaler['std'], dtype=np.float32)
+        X = (df[scaler['feature_names']].to_numpy(dtype=np.float32)[idx] - mean) / std
+        
+        target_col = next((c for c in TARGET_COLUMNS if c in df.columns), None)
+        y = df[target_col].to_numpy(dtype=np.float32)[idx] if target_col else None
+        print(f"📊 Calibrating with {len(X)} samples from {csv_path}")
+    else:
+        # Inputs are standardized, so N(0, 1) is a reasonable stand-in
+        X = rng.standard_normal((num_samples, input_dim)).astype(np.float32)
+        y = None
+        print(f"⚠️  {csv_path} or scaler not found - calibrating with synthetic N(0, 1) samples")
+    
+    return X, y
+
+def make_representative_dataset(model_name, input_dim, num_samples=100):
+    """Calibration samples for INT8 quantization, in the model's standardized input space"""
+    
+    samples, _ = load_calibration_data(model_name, input_dim, num_samples)
+    
+    def representative_dataset():
+        for row in samples:
+            yield [row[np.newaxis, :]]
+    
+    return representative_dataset
+
+def quantize_with_inc(model_name, accuracy_tolerance=0.01):
+    """Alternative INT8 path: Intel Neural Compressor post-training quantization.
+    
+    INC calibrates on real samples and only accepts the INT8 graph if accuracy
+    stays within the tolerance. Saved next to the Keras model for CPU serving.
+    """
+    
+    try:
+        from neural_compressor import quantization
+        from neural_compressor.config import AccuracyCriterion, PostTrainingQuantConfig
+        from neural_compressor.data import DataLoader
+    except ImportError:
+        print("⚠️  neural_compressor not installed - skipping INC quantization")
+        print("   Install with: pip install neural-compressor")
+        return None
+    
+    print(f"\n⏳ Quantizing {model_name} with Intel Neural Compressor...")
+    
+    keras_path = f'models/{model_name.lower()}_model.keras'
+    output_path = f'models/{model_name.lower()}_model_int8_inc'
+    
+    model = convert_batchnorm_to_inference(tf.keras.models.load_model(keras_path))
+    X, y = load_calibration_data(model_name, model.input_shape[-1], num_samples=400)
+    if y is None:
+        print("❌ INC needs labelled calibration data - skipping")
+        return None
+    
+    # Disjoint slices of one shuffle: the accuracy check must not score the INT8
+    # model on the samples its ranges were calibrated on
+    split = len(X) // 2
+    X_cal, y_cal = X[:split], y[:split]
+    X_val, y_val = X[split:], y[split:]
+    print(f"   {len(X_cal)} calibration / {len(X_val)} held-out validation samples")
+    
+    class CalibrationDataset:
+        def __getitem__(self, i):
+            return X_cal[i], y_cal[i]
+        
+        def __len__(self):
+            return len(X_cal)
+    
+    def eval_func(q_model):
+        keras_model = getattr(q_model, 'model', q_model)
+        preds = np.asarray(keras_model(X_val, training=False)).ravel()
+        return float(((preds >= 0.5) == (y_val >= 0.5)).mean())
+    
+    conf = PostTrainingQuantConfig(
+        accuracy_criterion=AccuracyCriterion(criterion='absolute', tolerable_loss=accuracy_tolerance)
     )
     
-    return new_model
+    try:
+        q_model = quantization.fit(
+            model=model,
+            conf=conf,
+            calib_dataloader=DataLoader(framework='tensorflow', dataset=CalibrationDataset()),
+            eval_func=eval_func
+        )
+    except Exception as e:
+        print(f"❌ INC quantization failed: {e}")
+        return None
+    
+    if q_model is None:
+        print(f"❌ INC could not meet the {accuracy_tolerance:.0%} accuracy tolerance")
+        return None
+    
+    q_model.save(output_path)
+    print(f"✅ Saved INC INT8 Model: {output_path}")
+    return output_path
 
 def try_alternative_conversion(model, tflite_path):
     """Alternative conversion method without BatchNorm issues"""
     
     try:
-        # Save to SavedModel format first
-        saved_model_path = 'models/temp_saved_model'
-        model.save(saved_model_path, save_format='tf')
-        print(f"✅ Saved temporary SavedModel")
+        # Save to SavedModel format first, keyed by architecture + weights so
+        # retries and re-runs on an unchanged model reuse the export
+        digest = hashlib.sha1(model.to_json().encode())
+        for w in model.get_weights():
+            digest.update(w.tobytes())
+        saved_model_path = f'models/_smcache_{digest.hexdigest()[:12]}'
+        
+        if cached_saved_model(saved_model_path, lambda path: model.save(path, save_format='tf')):
+            print(f"✅ Reusing cached SavedModel: {saved_model_path}")
+        else:
+            print(f"✅ Saved SavedModel: {saved_model_path}")
         
         # Convert from SavedModel
         converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_path)
@@ -108,10 +235,6 @@ def try_alternative_conversion(model, tflite_path):
         
         print(f"✅ Saved TFLite Model (alternative method): {tflite_path}")
         
-        # Clean up
-        import shutil
-        shutil.rmtree(saved_model_path)
-        
         return True
         
     except Exception as e:
@@ -139,7 +262,8 @@ def verify_tflite_model(tflite_path, keras_model):
         test_input = np.random.randn(*input_shape).astype(np.float32)
         
         # Get Keras prediction (in inference mode)
-        keras_output = keras_model.predict(test_input, verbose=0)
+        # Direct call: predict() sets up a tf.data pipeline per call and only pays off for large batches
+        keras_output = keras_model(test_input, training=False).numpy()
         
         # Get TFLite prediction
         interpreter.set_tensor(input_details[0]['index'], test_input)
@@ -223,8 +347,8 @@ final probability = output[0][0];
     }
     
     guide_path = f'assets/{model_name.lower()}_flutter_guide.json'
-    with open(guide_path, 'w') as f:
-        json.dump(guide, f, indent=2)
+    with open(guide_path, 'wb') as f:
+        f.write(orjson.dumps(guide, option=orjson.OPT_INDENT_2))
     
     print(f"✅ Created Flutter guide: {guide_path}")
 
@@ -247,6 +371,7 @@ if __name__ == "__main__":
         if success:
             successful_conversions.append(model_name)
             create_flutter_guide(model_name)
+            quantize_with_inc(model_name)
         else:
             failed_conversions.append(model_name)
     
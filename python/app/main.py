@@ -1,7 +1,8 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from app.routes import predictions
 
-app = FastAPI(title="Explainable Healthcare AI API")
+app = FastAPI(title="Explainable Healthcare AI API", default_response_class=ORJSONResponse)
 
 app.include_router(predictions.router, prefix="/api")
 
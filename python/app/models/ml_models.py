@@ -1,14 +1,44 @@
 import tflite_runtime.interpreter as tflite
 from PIL import Image
 import numpy as np
+import torch
+import json
 import os
+import queue
 
 class SkinCancerModel:
-    def __init__(self, model_path='models/skin_cancer.tflite', labels_path='models/skin_labels.txt'):
-        self.interpreter = tflite.Interpreter(model_path=model_path)
-        self.interpreter.allocate_tensors()
-        self.input_details = self.interpreter.get_input_details()
-        self.output_details = self.interpreter.get_output_details()
+    """MobileNetV2 skin lesion classifier served from a pool of TFLite interpreters.
+
+    Interpreters are not thread-safe, so each concurrent predict() checks one
+    out of the pool. The .tflite file is mmap'd read-only, so every
+    interpreter shares a single copy of the weights.
+    """
+
+    def __init__(self, model_path='models/skin_cancer.tflite', labels_path='models/skin_labels.txt', pool_size=None):
+        # One single-threaded interpreter per physical core (half the logical cores on SMT hosts)
+        pool_size = pool_size or max(1, (os.cpu_count() or 2) // 2)
+        self._pool = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(self._create_interpreter(model_path))
+
+        interpreter, _ = self._pool.queue[0]
+        self.input_details = interpreter.get_input_details()
+        self.output_details = interpreter.get_output_details()
+        self._out_idx = self.output_details[0]['index']
+        self._output_scale, self._output_zero_point = self.output_details[0]['quantization']
+        # uint8 pixel -> model input lookup table. MobileNetV2 expects [-1, 1] (x / 127.5 - 1);
+        # full-integer models (convert_skin_tflite.py) get that value quantized with the input
+        # tensor's calibrated (scale, zero_point), whatever range calibration happened to see
+        self._input_lut = np.arange(256, dtype=np.float32) / np.float32(127.5) - np.float32(1.0)
+        input_dtype = self.input_details[0]['dtype']
+        if input_dtype in (np.uint8, np.int8):
+            scale, zero_point = self.input_details[0]['quantization']
+            if not scale:
+                raise ValueError(f"{model_path}: {np.dtype(input_dtype).name} input has no quantization parameters")
+            info = np.iinfo(input_dtype)
+            self._input_lut = np.clip(
+                np.round(self._input_lut / scale + zero_point), info.min, info.max
+            ).astype(input_dtype)
         
         with open(labels_path, 'r') as f:
             self.labels = [line.strip() for line in f.readlines()]
@@ -22,31 +52,192 @@ class SkinCancerModel:
             'nv': 'Nevus',
             'vasc': 'Vascular lesion'
         }
-        self.full_labels = [self.label_map.get(label, label) for label in self.labels]
+        self.full_labels = tuple(self.label_map.get(label, label) for label in self.labels)
+
+    @staticmethod
+    def _create_interpreter(model_path):
+        """Return an (interpreter, input tensor accessor) pair for the pool."""
+        # Recent tflite_runtime builds apply the XNNPACK delegate by default
+        try:
+            interpreter = tflite.Interpreter(model_path=model_path, num_threads=1)
+        except (TypeError, ValueError):
+            # Older runtimes without num_threads support
+            interpreter = tflite.Interpreter(model_path=model_path)
+        interpreter.allocate_tensors()
+        # interpreter.tensor() returns a callable yielding a numpy view of the input
+        # tensor's own buffer, so preprocessing writes in place with no set_tensor copy
+        return interpreter, interpreter.tensor(interpreter.get_input_details()[0]['index'])
 
     def predict(self, image: Image.Image):
         # Resize to 224x224
-        resized_image = image.resize((224, 224))
+        resized_image = image.resize((224, 224), Image.BILINEAR)
 
-        # Normalize to [-1, 1] for MobileNetV2
-        input_data = np.array(resized_image, dtype=np.float32)
-        input_data = (input_data / 255.0 - 0.5) * 2.0
-        input_data = np.expand_dims(input_data, axis=0)
+        pixels = np.asarray(resized_image, dtype=np.uint8)
+
+        slot = self._pool.get()
+        try:
+            interpreter, input_tensor = slot
+            input_view = input_tensor()
+            # Normalize (and quantize) with a single gather pass straight into the input tensor
+            np.take(self._input_lut, pixels, out=input_view[0])
+            # invoke() refuses to run while a view into tensor memory is alive
+            del input_view
+
+            interpreter.invoke()
+            # get_tensor copies, but the output is only len(labels) scores and must
+            # outlive the slot being handed to the next request
+            output_data = interpreter.get_tensor(self._out_idx)
+        finally:
+            self._pool.put(slot)
 
-        self.interpreter.set_tensor(self.input_details[0]['index'], input_data)
-        self.interpreter.invoke()
-        
-        output_data = self.interpreter.get_tensor(self.output_details[0]['index'])
         probabilities = output_data[0]
+        if self._output_scale:
+            probabilities = (probabilities.astype(np.float32) - self._output_zero_point) * self._output_scale
         
-        max_prob = np.max(probabilities)
-        max_index = np.argmax(probabilities)
+        max_index = int(probabilities.argmax())
         
         predicted_label = self.full_labels[max_index]
         
         return {
             'label': predicted_label,
-            'confidence': float(max_prob),
-            'probabilities': {self.full_labels[i]: float(probabilities[i]) for i in range(len(self.full_labels))}
+            'confidence': float(probabilities[max_index]),
+            'probabilities': dict(zip(self.full_labels, probabilities.tolist()))
         }
 
+
+class ClinicalRiskModel:
+    """Heart / diabetes risk model served from the Clinical_Risk_convter.py TFLite artifacts.
+
+    The interpreter, tensor indices and input buffer are created once; the
+    interpreter is not thread-safe, so callers must serialize predict().
+    """
+
+    def __init__(self, model_name, assets_dir='assets'):
+        prefix = os.path.join(assets_dir, model_name.lower())
+
+        self.interpreter = tflite.Interpreter(
+            model_path=f'{prefix}_model.tflite',
+            num_threads=os.cpu_count(),
+            experimental_preserve_all_tensors=False
+        )
+        self.interpreter.allocate_tensors()
+        self._in_idx = self.interpreter.get_input_details()[0]['index']
+        self._out_idx = self.interpreter.get_output_details()[0]['index']
+
+        with open(f'{prefix}_scaler.json', 'r') as f:
+            scaler = json.load(f)
+        self.feature_names = scaler['feature_names']
+        self.mean = np.array(scaler['mean'], dtype=np.float32)
+        self.std = np.array(scaler['std'], dtype=np.float32)
+
+        self.mappings = {}
+        if os.path.exists(f'{prefix}_mappings.json'):
+            with open(f'{prefix}_mappings.json', 'r') as f:
+                self.mappings = json.load(f)
+
+        self._input = np.empty((1, len(self.feature_names)), dtype=np.float32)
+
+    def predict(self, features: dict):
+        # Raises KeyError for a missing feature or an unknown categorical value
+        for i, name in enumerate(self.feature_names):
+            value = features[name]
+            if name in self.mappings:
+                value = self.mappings[name][str(value)]
+            self._input[0, i] = value
+
+        np.subtract(self._input, self.mean, out=self._input)
+        np.divide(self._input, self.std, out=self._input)
+
+        self.interpreter.set_tensor(self._in_idx, self._input)
+        self.interpreter.invoke()
+        probability = float(self.interpreter.get_tensor(self._out_idx)[0][0])
+
+        return {
+            'risk': probability,
+            'prediction': 'High Risk' if probability >= 0.5 else 'Low Risk'
+        }
+
+class PneumoniaTRTModel:
+    """TensorRT FP16 engine for the pneumonia classifier's forward pass.
+
+    Exported once to ONNX and built into a serialized engine that is reused
+    across restarts (rebuilt if the weights are newer or the input channel
+    count changed). Grad-CAM still needs autograd, so the PyTorch model is
+    kept alongside this for explanations.
+    """
+
+    def __init__(self, torch_model, weights_path='models/pneumonia_model.pth',
+                 onnx_path='models/pneumonia_model.onnx', engine_path='models/pneumonia_model.trt',
+                 max_batch=16):
+        import tensorrt as trt
+
+        self.logger = trt.Logger(trt.Logger.WARNING)
+
+        runtime = trt.Runtime(self.logger)
+        in_channels = torch_model.in_channels
+
+        self.engine = None
+        if os.path.exists(engine_path) and os.path.getmtime(engine_path) >= os.path.getmtime(weights_path):
+            with open(engine_path, 'rb') as f:
+                self.engine = runtime.deserialize_cuda_engine(f.read())
+
+        # Also rebuild engines cached for a different input layout (e.g. the old 3-channel stem)
+        if self.engine is None or self._input_channels(trt) != in_channels:
+            self._export_onnx(torch_model, onnx_path)
+            serialized = self._build_engine(trt, onnx_path, max_batch, in_channels)
+            with open(engine_path, 'wb') as f:
+                f.write(serialized)
+            self.engine = runtime.deserialize_cuda_engine(serialized)
+
+        self.context = self.engine.create_execution_context()
+        names = [self.engine.get_tensor_name(i) for i in range(self.engine.num_io_tensors)]
+        self.input_name = next(n for n in names if self.engine.get_tensor_mode(n) == trt.TensorIOMode.INPUT)
+        self.output_name = next(n for n in names if self.engine.get_tensor_mode(n) == trt.TensorIOMode.OUTPUT)
+
+    def _input_channels(self, trt):
+        names = [self.engine.get_tensor_name(i) for i in range(self.engine.num_io_tensors)]
+        input_name = next(n for n in names if self.engine.get_tensor_mode(n) == trt.TensorIOMode.INPUT)
+        return self.engine.get_tensor_shape(input_name)[1]
+
+    @staticmethod
+    def _export_onnx(torch_model, onnx_path):
+        device = next(torch_model.parameters()).device
+        dummy = torch.randn(1, torch_model.in_channels, 224, 224, device=device)
+        torch.onnx.export(
+            torch_model, dummy, onnx_path,
+            input_names=['input'], output_names=['logits'],
+            dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+            opset_version=17
+        )
+
+    def _build_engine(self, trt, onnx_path, max_batch, in_channels):
+        builder = trt.Builder(self.logger)
+        network = builder.create_network(1 << int(trt.NetworkDefinitionCreationFlag.EXPLICIT_BATCH))
+        parser = trt.OnnxParser(network, self.logger)
+        with open(onnx_path, 'rb') as f:
+            if not parser.parse(f.read()):
+                raise RuntimeError(f"Failed to parse {onnx_path}: {parser.get_error(0)}")
+
+        config = builder.create_builder_config()
+        config.set_flag(trt.BuilderFlag.FP16)
+        profile = builder.create_optimization_profile()
+        profile.set_shape('input', (1, in_channels, 224, 224),
+                          (max(1, max_batch // 2), in_channels, 224, 224),
+                          (max_batch, in_channels, 224, 224))
+        config.add_optimization_profile(profile)
+
+        serialized = builder.build_serialized_network(network, config)
+        if serialized is None:
+            raise RuntimeError("TensorRT engine build failed")
+        return serialized
+
+    def __call__(self, x):
+        """Run a CUDA float32 NCHW batch through the engine, returning logits."""
+        x = x.float().contiguous()
+        logits = torch.empty((x.shape[0], 2), device=x.device, dtype=torch.float32)
+
+        self.context.set_input_shape(self.input_name, tuple(x.shape))
+        self.context.set_tensor_address(self.input_name, x.data_ptr())
+        self.context.set_tensor_address(self.output_name, logits.data_ptr())
+        self.context.execute_async_v3(torch.cuda.current_stream().cuda_stream)
+        return logits
@@ -1,51 +1,153 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, Body
 from PIL import Image
+import asyncio
+import base64
 import io
+import cv2
 import torch
 import torchvision.transforms as transforms
 import numpy as np
 
 from model import PneumoniaModel
 from gradcam import GradCAM
-from app.models.ml_models import SkinCancerModel
+from app.models.ml_models import SkinCancerModel, PneumoniaTRTModel, ClinicalRiskModel
 
 router = APIRouter()
 
 # Pneumonia Model Initialization
 device = "cuda" if torch.cuda.is_available() else "cpu"
-pneumonia_model = PneumoniaModel().to(device)
+pneumonia_model = PneumoniaModel(weights=None).to(device)
 pneumonia_model.load_state_dict(torch.load("models/pneumonia_model.pth", map_location=device))
 pneumonia_model.eval()
 
+# channels_last (NHWC) lets cuDNN pick Tensor Core conv kernels under FP16 autocast
+pneumonia_model = pneumonia_model.to(memory_format=torch.channels_last)
+torch.backends.cudnn.benchmark = True
+
 transform = transforms.Compose([
-    transforms.Resize((224,224)),
-    transforms.Grayscale(num_output_channels=3),
+    transforms.Resize((224,224), interpolation=transforms.InterpolationMode.BILINEAR, antialias=False),
+    transforms.Grayscale(num_output_channels=1),
     transforms.ToTensor(),
-    transforms.Normalize([0.5]*3, [0.5]*3)
+    transforms.Normalize([0.5], [0.5])
 ])
 
 gradcam = GradCAM(pneumonia_model, pneumonia_model.model.layer4)
 
+# Classification pass: TensorRT on CUDA, a frozen TorchScript trace on CPU,
+# eager PyTorch otherwise. GradCAM keeps the eager model for autograd.
+pneumonia_forward = pneumonia_model
+if device == "cuda":
+    try:
+        pneumonia_forward = PneumoniaTRTModel(pneumonia_model, weights_path="models/pneumonia_model.pth")
+    except Exception as e:
+        print(f"⚠️  TensorRT engine unavailable, using PyTorch eager inference: {e}")
+else:
+    try:
+        with torch.no_grad():
+            example = torch.randn(1, pneumonia_model.in_channels, 224, 224).to(memory_format=torch.channels_last)
+            traced = torch.jit.freeze(torch.jit.trace(pneumonia_model, example))
+        pneumonia_forward = torch.jit.optimize_for_inference(traced)
+    except Exception as e:
+        print(f"⚠️  TorchScript export failed, using PyTorch eager inference: {e}")
+
+# Grad-CAM is returned at 1/4 resolution; layer4 is only 7x7, so clients lose
+# nothing by scaling the PNG back up to the 224x224 input
+GRADCAM_SIZE = (56, 56)
+
+# Micro-batching: concurrent requests are coalesced into one forward pass.
+# Up to MAX_BATCH_SIZE images, waiting at most MAX_BATCH_WAIT seconds for the batch to fill.
+MAX_BATCH_SIZE = 16
+MAX_BATCH_WAIT = 0.005
+_batch_queue = None
+
+def _classify_batch(batch):
+    # Pad to a multiple of 8 on GPU so the batch dim is Tensor Core friendly
+    n = batch.shape[0]
+    pad = -n % 8 if device == "cuda" else 0
+    if pad:
+        batch = torch.cat([batch, batch.new_zeros((pad, *batch.shape[1:]))])
+
+    with torch.inference_mode(), torch.autocast(device_type=device, dtype=torch.float16, enabled=device == "cuda"):
+        logits = pneumonia_forward(batch)
+        return torch.softmax(logits[:n].float(), dim=1).cpu().numpy()
+
+async def _pneumonia_batcher():
+    loop = asyncio.get_running_loop()
+    while True:
+        items = [await _batch_queue.get()]
+        deadline = loop.time() + MAX_BATCH_WAIT
+        while len(items) < MAX_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(_batch_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # Runs on the event loop thread so it never overlaps with GradCAM's hooked forward/backward
+        try:
+            probs = _classify_batch(torch.cat([x for x, _ in items]))
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            continue
+
+        for (_, future), p in zip(items, probs):
+            if not future.done():
+                future.set_result(p)
+
+async def classify_pneumonia(x):
+    global _batch_queue
+    if _batch_queue is None:
+        _batch_queue = asyncio.Queue()
+        asyncio.get_running_loop().create_task(_pneumonia_batcher())
+
+    future = asyncio.get_running_loop().create_future()
+    await _batch_queue.put((x, future))
+    return await future
+
 # Skin Cancer Model Initialization
 skin_cancer_model = SkinCancerModel(model_path='models/skin_cancer.tflite', labels_path='models/skin_labels.txt')
 
+# Clinical Risk Models (TFLite interpreters allocated once at startup)
+clinical_models = {name.lower(): ClinicalRiskModel(name) for name in ("Heart", "Diabetes")}
+clinical_locks = {name: asyncio.Lock() for name in clinical_models}
+
+def decode_image(contents):
+    image = Image.open(io.BytesIO(contents))
+    # JPEG: let libjpeg downscale in the DCT domain to the smallest size >= 224x224
+    image.draft(image.mode, (224, 224))
+    return image.convert("RGB")
+
+def load_pneumonia_input(contents):
+    image = decode_image(contents)
+    return transform(image).unsqueeze(0).to(device, memory_format=torch.channels_last)
+
+# Image decode / resize / normalize run in the default threadpool (PIL and torch
+# release the GIL) so the event loop keeps accepting uploads meanwhile
 @router.post("/predict/pneumonia")
 async def predict_pneumonia(file: UploadFile = File(...)):
     try:
-        image = Image.open(io.BytesIO(await file.read())).convert("RGB")
-        x = transform(image).unsqueeze(0).to(device)
+        contents = await file.read()
+        x = await asyncio.to_thread(load_pneumonia_input, contents)
 
-        with torch.no_grad():
-            logits = pneumonia_model(x)
-            probs = torch.softmax(logits, dim=1).cpu().numpy()[0]
+        probs = await classify_pneumonia(x)
 
         pred_class = int(np.argmax(probs))
-        cam = gradcam.generate(x, pred_class)
+        # Grad-CAM forward/backward also runs on Tensor Cores under FP16 autocast
+        with torch.autocast(device_type=device, dtype=torch.float16, enabled=device == "cuda"):
+            cam = gradcam.generate(x, pred_class, size=GRADCAM_SIZE)
+
+        # Colorized PNG is far smaller than a 224x224 float list in JSON
+        heatmap = (cam * 255).to(torch.uint8).cpu().numpy()
+        _, png = cv2.imencode('.png', cv2.applyColorMap(heatmap, cv2.COLORMAP_JET))
 
         return {
             "prediction": "PNEUMONIA" if pred_class == 1 else "NORMAL",
             "confidence": float(probs[pred_class]),
-            "gradcam": cam.tolist()
+            "gradcam": base64.b64encode(png).decode('utf-8')
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -53,8 +155,24 @@ async def predict_pneumonia(file: UploadFile = File(...)):
 @router.post("/predict/skin_cancer")
 async def predict_skin_cancer(file: UploadFile = File(...)):
     try:
-        image = Image.open(io.BytesIO(await file.read())).convert("RGB")
-        prediction = skin_cancer_model.predict(image)
+        contents = await file.read()
+        image = await asyncio.to_thread(decode_image, contents)
+        # SkinCancerModel checks an interpreter out of its pool, so requests run in parallel
+        prediction = await asyncio.to_thread(skin_cancer_model.predict, image)
         return prediction
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/predict/clinical/{model_name}")
+async def predict_clinical_risk(model_name: str, features: dict = Body(...)):
+    model = clinical_models.get(model_name.lower())
+    if model is None:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {model_name}")
+
+    try:
+        async with clinical_locks[model_name.lower()]:
+            return model.predict(features)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Missing or invalid feature value: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,184 @@
+// Add to pubspec.yaml:
+// dependencies:
+//   tflite_flutter: ^0.10.1
+//
+// flutter:
+//   assets:
+//     - assets/stroke_model.tflite
+//     - assets/stroke_scaler.json
+//     - assets/scaler_complete.json
+//
+// Model input: [1, {NUM_FEATURES}] scaled features
+
+import 'package:flutter/services.dart';
+import 'package:tflite_flutter/tflite_flutter.dart';
+import 'dart:convert';
+import 'dart:math' as math;
+
+class StrokeRiskPredictor {
+  Interpreter? _interpreter;
+  List<double>? _mean;
+  List<double>? _std;
+  List<double>? _meanComplete;
+  List<double>? _stdComplete;
+  bool _useFeatureEngineering = false;
+  
+  Future<void> loadModel() async {
+    try {
+      // Load TFLite model
+      // XNNPACK SIMD kernels, multi-threaded (matches the conversion-time test)
+      final options = InterpreterOptions()
+        ..threads = 4
+        ..addDelegate(XNNPackDelegate());
+      _interpreter = await Interpreter.fromAsset('assets/stroke_model.tflite', options: options);
+      
+      // Check if model uses feature engineering
+      var inputShape = _interpreter!.getInputTensor(0).shape;
+      _useFeatureEngineering = inputShape[1] > 5;
+      
+      print('Model loaded successfully');
+      print('Input shape: ${inputShape}');
+      print('Using feature engineering: $_useFeatureEngineering');
+      
+      // Load basic scaler parameters
+      final scalerJson = await rootBundle.loadString('assets/stroke_scaler.json');
+      final scaler = json.decode(scalerJson);
+      _mean = List<double>.from(scaler['mean']);
+      _std = List<double>.from(scaler['std']);
+      
+      // Load complete scaler if using feature engineering
+      if (_useFeatureEngineering) {
+        try {
+          final completeScalerJson = await rootBundle.loadString('assets/scaler_complete.json');
+          final completeScaler = json.decode(completeScalerJson);
+          _meanComplete = List<double>.from(completeScaler['mean']);
+          _stdComplete = List<double>.from(completeScaler['std']);
+          print('Complete scaler loaded');
+        } catch (e) {
+          print('Warning: Could not load complete scaler: $e');
+        }
+      }
+      
+    } catch (e) {
+      print('Error loading model: $e');
+      rethrow;
+    }
+  }
+  
+  List<double> _computeEngineeredFeatures(
+    double age,
+    double hypertension,
+    double heartDisease,
+    double glucose,
+    double bmi,
+  ) {
+    return [
+      age * glucose / 100,      // age_glucose
+      bmi * glucose / 100,      // bmi_glucose
+      age * bmi / 100,          // age_bmi
+      hypertension + heartDisease,  // health_risk
+      age * age,                // age_squared
+      bmi * bmi,                // bmi_squared
+      age > 60 ? 2.0 : (age > 40 ? 1.0 : 0.0),  // age_group_risk
+      glucose > 200 ? 2.0 : (glucose > 140 ? 1.0 : 0.0),  // glucose_risk
+      bmi > 30 ? 2.0 : (bmi > 25 ? 1.0 : 0.0),  // bmi_category
+    ];
+  }
+  
+  double predictStrokeRisk({
+    required double age,
+    required int hypertension,
+    required int heartDisease,
+    required double glucose,
+    required double bmi,
+  }) {
+    if (_interpreter == null || _mean == null || _std == null) {
+      throw Exception('Model not loaded. Call loadModel() first.');
+    }
+    
+    // Prepare base input: [age, hypertension, heart_disease, glucose, bmi]
+    List<double> input = [
+      age,
+      hypertension.toDouble(),
+      heartDisease.toDouble(),
+      glucose,
+      bmi
+    ];
+    
+    List<double> scaledInput;
+    
+    if (_useFeatureEngineering && _meanComplete != null && _stdComplete != null) {
+      // Compute engineered features
+      List<double> engineered = _computeEngineeredFeatures(
+        age, hypertension.toDouble(), heartDisease.toDouble(), glucose, bmi
+      );
+      
+      // Combine all features
+      List<double> allFeatures = [...input, ...engineered];
+      
+      // Scale using complete scaler
+      scaledInput = [];
+      for (int i = 0; i < allFeatures.length; i++) {
+        scaledInput.add((allFeatures[i] - _meanComplete![i]) / _stdComplete![i]);
+      }
+    } else {
+      // Scale using basic scaler
+      scaledInput = [];
+      for (int i = 0; i < input.length; i++) {
+        scaledInput.add((input[i] - _mean![i]) / _std![i]);
+      }
+      
+      // If model expects more features but we don't have complete scaler,
+      // pad with zeros (not ideal, but fallback)
+      var expectedFeatures = _interpreter!.getInputTensor(0).shape[1];
+      while (scaledInput.length < expectedFeatures) {
+        scaledInput.add(0.0);
+      }
+    }
+    
+    // Reshape input to [1, numFeatures]
+    var inputArray = [scaledInput];
+    
+    // Prepare output buffer
+    var output = List.filled(1, List.filled(1, 0.0)).cast<List<double>>();
+    
+    // Run inference
+    _interpreter!.run(inputArray, output);
+    
+    // Return stroke risk as percentage
+    double riskProbability = output[0][0];
+    return riskProbability * 100;
+  }
+  
+  String getRiskLevel(double riskPercentage) {
+    if (riskPercentage < 10) return 'Low';
+    if (riskPercentage < 30) return 'Moderate';
+    if (riskPercentage < 60) return 'High';
+    return 'Very High';
+  }
+  
+  void dispose() {
+    _interpreter?.close();
+  }
+}
+
+// Usage example:
+void main() async {
+  final predictor = StrokeRiskPredictor();
+  await predictor.loadModel();
+  
+  double risk = predictor.predictStrokeRisk(
+    age: 65,
+    hypertension: 1,
+    heartDisease: 1,
+    glucose: 200,
+    bmi: 32,
+  );
+  
+  String level = predictor.getRiskLevel(risk);
+  
+  print('Stroke Risk: ${risk.toStringAsFixed(2)}%');
+  print('Risk Level: $level');
+  
+  predictor.dispose();
+}
@@ -1,12 +1,128 @@
+import tf_setup  # CPU-only TensorFlow, also in the spawned batch_convert workers that re-import this module
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
 import tensorflow as tf
 import numpy as np
+import pandas as pd
 import json
-import os
+import hashlib
 from datetime import datetime
+from functools import lru_cache
+from convert_utils import convert_batchnorm_to_inference, cached_saved_model
+
+STROKE_CSV = 'stroke.csv'
+BASE_FEATURES = ['age', 'hypertension', 'heart_disease', 'avg_glucose_level', 'bmi']
+SAVED_MODEL_DIR = 'models/temp_saved_stroke'  # + _<hash of the input .keras>
+
+@lru_cache(maxsize=None)
+def load_json(path):
+    """Parse a JSON artifact once per process (shared by calibration and test inference)"""
+    with open(path, 'r') as f:
+        return json.load(f)
+
+@lru_cache(maxsize=None)
+def load_scaler(path):
+    """(mean, std) float32 arrays from a scaler JSON, built once per process"""
+    scaler_data = load_json(path)
+    return (np.array(scaler_data['mean'], dtype=np.float32),
+            np.array(scaler_data['std'], dtype=np.float32))
+
+def engineer_features(X):
+    """Vectorized stroke feature engineering: (N, 5) raw features -> (N, 14), same order as train_stroke_model.py"""
+    age, hypertension, heart_disease, glucose, bmi = X.T
+    return np.column_stack([
+        X,
+        age * glucose / 100,                        # age_glucose
+        bmi * glucose / 100,                        # bmi_glucose
+        age * bmi / 100,                            # age_bmi
+        hypertension + heart_disease,               # health_risk
+        age ** 2,                                   # age_squared
+        bmi ** 2,                                   # bmi_squared
+        np.digitize(age, [40, 60], right=True),     # age_group_risk
+        np.digitize(glucose, [140, 200], right=True),  # glucose_risk
+        np.digitize(bmi, [25, 30], right=True)      # bmi_category
+    ]).astype(np.float32)
+
+def load_calibration_data(num_features, num_samples=100):
+    """Scaled rows from the stroke training CSV, laid out like the model input, for int8 calibration"""
+    if not os.path.exists(STROKE_CSV):
+        raise FileNotFoundError(f"int8 calibration needs '{STROKE_CSV}' (the training data)")
+
+    df = pd.read_csv(STROKE_CSV, usecols=BASE_FEATURES).dropna()
+    X = df.sample(n=min(num_samples, len(df)), random_state=42)[BASE_FEATURES].to_numpy(np.float32)
+
+    if num_features > len(BASE_FEATURES):
+        X = engineer_features(X)
+        scaler_path = 'models/scaler_complete.json'
+    else:
+        scaler_path = 'assets/stroke_scaler.json'
+
+    mean, std = load_scaler(scaler_path)
+    return (X - mean) / std
+
+def load_inference_model(keras_model_path):
+    """Load the trained Keras model and fold its BatchNormalization layers for conversion"""
+    
+    # 1. Load the Keras model
+    print("\n" + "="*60)
+    print("📦 LOADING KERAS MODEL")
+    print("="*60)
+    
+    model = tf.keras.models.load_model(keras_model_path)
+    print(f"✅ Model loaded successfully")
+    print(f"   Input shape: {model.input_shape}")
+    print(f"   Output shape: {model.output_shape}")
+    
+    # Display model summary
+    print("\n📊 Model Architecture:")
+    model.summary()
+    
+    # 2. Fold BatchNormalization into the preceding Dense layers
+    print("\n" + "="*60)
+    print("🔧 PREPARING MODEL FOR CONVERSION")
+    print("="*60)
+    print("⚙️  Folding BatchNormalization layers into Dense weights...")
+    
+    # Setting trainable=False leaves BN in the graph as separate mul/add ops;
+    # folding removes them and their extra quantization points
+    return convert_batchnorm_to_inference(model)
+
+def export_saved_model(keras_model_path, saved_model_dir=None):
+    """Export the BN-folded model as a SavedModel, reused only for the same input file and contents"""
+    
+    if saved_model_dir is None:
+        # Keyed by path + content hash: converting a different (or older) .keras never hits
+        # another model's export
+        digest = hashlib.sha1(os.path.abspath(keras_model_path).encode())
+        with open(keras_model_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        saved_model_dir = f'{SAVED_MODEL_DIR}_{digest.hexdigest()[:12]}'
+    
+    def save(path):
+        model = load_inference_model(keras_model_path)
+        
+        # Trace once with a fixed batch size of 1 (what the Flutter app feeds the interpreter)
+        input_shape = model.input_shape[1:]  # Remove batch dimension
+        
+        @tf.function(input_signature=[tf.TensorSpec(shape=[1, *input_shape], dtype=tf.float32)])
+        def serve_fn(input_tensor):
+            return model(input_tensor, training=False)
+        
+        tf.saved_model.save(model, path, signatures=serve_fn)
+    
+    if cached_saved_model(saved_model_dir, save):
+        print(f"\n♻️  Reusing SavedModel: {saved_model_dir}")
+    else:
+        print(f"✅ SavedModel exported: {saved_model_dir}")
+    return saved_model_dir
 
 def convert_keras_to_tflite(keras_model_path='models/stroke_model.keras',
                              tflite_output_path='assets/stroke_model.tflite',
-                             quantization=False):
+                             quantization=False,
+                             saved_model_dir=None):
     """
     Convert Keras model to TFLite format for Flutter app
     Handles BatchNormalization layers properly
@@ -14,7 +130,9 @@ def convert_keras_to_tflite(keras_model_path='models/stroke_model.keras',
     Args:
         keras_model_path: Path to the .keras model file
         tflite_output_path: Output path for .tflite model
-        quantization: Whether to apply quantization (smaller file, slightly less accurate)
+        quantization: False for full precision, True for float16 weights,
+                      'int8' for full-integer quantization (int8 weights, activations and I/O)
+        saved_model_dir: SavedModel already produced by export_saved_model(); skips the export check
     """
     
     print("\n" + "="*70)
@@ -23,47 +141,19 @@ def convert_keras_to_tflite(keras_model_path='models/stroke_model.keras',
     print(f"📅 Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"📂 Input: {keras_model_path}")
     print(f"📂 Output: {tflite_output_path}")
-    print(f"🔧 Quantization: {'Enabled' if quantization else 'Disabled'}")
+    print(f"🔧 Quantization: {'Int8' if quantization == 'int8' else 'Enabled' if quantization else 'Disabled'}")
     
     # Check if model exists
-    if not os.path.exists(keras_model_path):
+    if saved_model_dir is None and not os.path.exists(keras_model_path):
         print(f"\n❌ Error: Model file not found at '{keras_model_path}'")
         print("   Please train the model first using train_stroke_model.py")
         return False
     
     try:
-        # 1. Load the Keras model
-        print("\n" + "="*60)
-        print("📦 LOADING KERAS MODEL")
-        print("="*60)
-        
-        model = tf.keras.models.load_model(keras_model_path)
-        print(f"✅ Model loaded successfully")
-        print(f"   Input shape: {model.input_shape}")
-        print(f"   Output shape: {model.output_shape}")
-        
-        # Display model summary
-        print("\n📊 Model Architecture:")
-        model.summary()
-        
-        # 2. Set BatchNormalization to inference mode
-        print("\n" + "="*60)
-        print("🔧 PREPARING MODEL FOR CONVERSION")
-        print("="*60)
-        print("⚙️  Setting BatchNormalization layers to inference mode...")
-        
-        # Clone the model and set training=False for all layers
-        for layer in model.layers:
-            if isinstance(layer, tf.keras.layers.BatchNormalization):
-                layer.trainable = False
-        
-        # Create a concrete function with fixed batch size
-        # This helps avoid issues with BatchNormalization
-        input_shape = model.input_shape[1:]  # Remove batch dimension
-        
-        @tf.function(input_signature=[tf.TensorSpec(shape=[1, *input_shape], dtype=tf.float32)])
-        def serve_fn(input_tensor):
-            return model(input_tensor, training=False)
+        # 1-2. Load the Keras model, fold BatchNormalization and export a SavedModel
+        # (skipped when it is up to date or batch_convert already did it)
+        if saved_model_dir is None:
+            saved_model_dir = export_saved_model(keras_model_path)
         
         print("✅ Model prepared for conversion")
         
@@ -72,21 +162,31 @@ def convert_keras_to_tflite(keras_model_path='models/stroke_model.keras',
         print("🔄 CONVERTING TO TFLITE")
         print("="*60)
         
-        # Use the concrete function for conversion
-        concrete_func = serve_fn.get_concrete_function()
-        converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_func])
-        
-        # Set converter options
-        converter.target_spec.supported_ops = [
-            tf.lite.OpsSet.TFLITE_BUILTINS,  # Enable TensorFlow Lite ops
-            tf.lite.OpsSet.SELECT_TF_OPS      # Enable TensorFlow ops (for better compatibility)
-        ]
+        # Convert from the persisted SavedModel: no per-run retrace
+        converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir)
         
-        # Experimental options for better compatibility
-        converter._experimental_lower_tensor_list_ops = False
+        # Set converter options: with BN folded the MLP is plain FullyConnected + activations,
+        # so builtins suffice and the Flutter app doesn't need the Flex delegate
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS]
         
         # Apply optimizations
-        if quantization:
+        if quantization == 'int8':
+            print("⚙️  Applying full-integer int8 quantization...")
+            signature = tf.saved_model.load(saved_model_dir).signatures['serving_default']
+            num_features = next(iter(signature.structured_input_signature[1].values())).shape[-1]
+            calibration_data = load_calibration_data(num_features)
+            print(f"   Calibrating on {len(calibration_data)} scaled rows from {STROKE_CSV}")
+
+            def representative_dataset():
+                for row in calibration_data:
+                    yield [row.reshape(1, -1)]
+
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = representative_dataset
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.inference_input_type = tf.int8
+            converter.inference_output_type = tf.int8
+        elif quantization:
             print("⚙️  Applying dynamic range quantization...")
             converter.optimizations = [tf.lite.Optimize.DEFAULT]
             # For float16 quantization (good balance)
@@ -96,7 +196,15 @@ def convert_keras_to_tflite(keras_model_path='models/stroke_model.keras',
         
         # Convert
         print("🔄 Converting...")
-        tflite_model = converter.convert()
+        try:
+            tflite_model = converter.convert()
+        except Exception:
+            # Builtins only: an unsupported op fails here instead of silently pulling in Flex
+            print("\n❌ Conversion failed with TFLITE_BUILTINS only.")
+            print("   Check the error below for ops that are 'not supported by TFLite builtins'")
+            print("   and replace them in train_stroke_model.py (e.g. swish/gelu -> relu)")
+            print("   rather than re-enabling SELECT_TF_OPS.")
+            raise
         
         # 4. Save TFLite model
         print("\n" + "="*60)
@@ -118,8 +226,10 @@ def convert_keras_to_tflite(keras_model_path='models/stroke_model.keras',
         print("🧪 TESTING TFLITE MODEL")
         print("="*60)
         
-        # Load TFLite model and allocate tensors
-        interpreter = tf.lite.Interpreter(model_path=tflite_output_path)
+        # Load TFLite model and allocate tensors. TF's builtin op resolver applies the
+        # XNNPACK delegate by default; num_threads lets it split the FullyConnected kernels
+        num_threads = max(1, (os.cpu_count() or 2) // 2)
+        interpreter = tf.lite.Interpreter(model_path=tflite_output_path, num_threads=num_threads)
         interpreter.allocate_tensors()
         
         # Get input and output details
@@ -145,64 +255,45 @@ def convert_keras_to_tflite(keras_model_path='models/stroke_model.keras',
         metadata_path = 'models/model_metadata.json'
         
         if os.path.exists(scaler_path):
-            with open(scaler_path, 'r') as f:
-                scaler_data = json.load(f)
-            
             # Create test input: [age=65, hypertension=1, heart_disease=1, glucose=200, bmi=32]
             test_input = np.array([[65, 1, 1, 200, 32]], dtype=np.float32)
             
-            # Scale the input
-            mean = np.array(scaler_data['mean'], dtype=np.float32)
-            std = np.array(scaler_data['std'], dtype=np.float32)
-            test_input_scaled = (test_input - mean) / std
+            # Scale the input straight into a preallocated buffer laid out like the model input
+            expected_features = input_details[0]['shape'][1]
+            test_input_scaled = np.empty((1, expected_features), dtype=np.float32)
+            base_scaled = test_input_scaled[:, :len(BASE_FEATURES)]
+            mean, std = load_scaler(scaler_path)
+            np.subtract(test_input, mean, out=base_scaled)
+            np.divide(base_scaled, std, out=base_scaled)
             
             # Check if model expects more features (engineered features)
-            expected_features = input_details[0]['shape'][1]
             if expected_features > 5:
                 print(f"   ⚙️  Model expects {expected_features} features (includes engineered features)")
                 
                 # Load metadata to get engineered features info
                 if os.path.exists(metadata_path):
-                    with open(metadata_path, 'r') as f:
-                        metadata = json.load(f)
+                    metadata = load_json(metadata_path)
                     print(f"   ⚙️  Computing {len(metadata.get('engineered_features', []))} engineered features...")
                 
-                # Compute engineered features
-                age, hypertension, heart_disease, glucose, bmi = test_input[0]
-                
-                engineered = [
-                    age * glucose / 100,      # age_glucose
-                    bmi * glucose / 100,      # bmi_glucose
-                    age * bmi / 100,          # age_bmi
-                    hypertension + heart_disease,  # health_risk
-                    age ** 2,                 # age_squared
-                    bmi ** 2,                 # bmi_squared
-                    2 if age > 60 else (1 if age > 40 else 0),  # age_group_risk
-                    2 if glucose > 200 else (1 if glucose > 140 else 0),  # glucose_risk
-                    2 if bmi > 30 else (1 if bmi > 25 else 0)  # bmi_category
-                ]
+                # Compute engineered features (same kernel as the int8 calibration data)
+                full_input = engineer_features(test_input)
+                engineered = full_input[:, len(BASE_FEATURES):]
                 
                 # Scale engineered features
                 if os.path.exists('models/scaler_complete.json'):
-                    with open('models/scaler_complete.json', 'r') as f:
-                        complete_scaler = json.load(f)
-                    
-                    full_input = list(test_input[0]) + engineered
-                    mean_all = np.array(complete_scaler['mean'], dtype=np.float32)
-                    std_all = np.array(complete_scaler['std'], dtype=np.float32)
-                    test_input_scaled = np.array([(np.array(full_input) - mean_all) / std_all], dtype=np.float32)
+                    mean_all, std_all = load_scaler('models/scaler_complete.json')
+                    np.subtract(full_input, mean_all, out=test_input_scaled)
+                    np.divide(test_input_scaled, std_all, out=test_input_scaled)
                 else:
                     # Fallback: use basic scaling for engineered features
-                    engineered_scaled = [(e - np.mean(engineered)) / (np.std(engineered) + 1e-7) for e in engineered]
-                    test_input_scaled = np.concatenate([test_input_scaled, [engineered_scaled]], axis=1).astype(np.float32)
-            
-            # Ensure correct shape
-            test_input_scaled = test_input_scaled.reshape(1, -1).astype(np.float32)
+                    engineered_scaled = test_input_scaled[:, len(BASE_FEATURES):]
+                    np.subtract(engineered, engineered.mean(), out=engineered_scaled)
+                    engineered_scaled /= engineered.std() + 1e-7
             
             # Run inference
-            interpreter.set_tensor(input_details[0]['index'], test_input_scaled)
+            interpreter.set_tensor(input_details[0]['index'], quantize_input(test_input_scaled, input_details[0]))
             interpreter.invoke()
-            output = interpreter.get_tensor(output_details[0]['index'])
+            output = dequantize_output(interpreter.get_tensor(output_details[0]['index']), output_details[0])
             
             risk_percentage = output[0][0] * 100
             print(f"✅ Test successful!")
@@ -225,9 +316,9 @@ def convert_keras_to_tflite(keras_model_path='models/stroke_model.keras',
             print("   ⚠️  Scaler file not found - skipping realistic test")
             # Use zeros as input (neutral test)
             test_input = np.zeros((1, input_details[0]['shape'][1]), dtype=np.float32)
-            interpreter.set_tensor(input_details[0]['index'], test_input)
+            interpreter.set_tensor(input_details[0]['index'], quantize_input(test_input, input_details[0]))
             interpreter.invoke()
-            output = interpreter.get_tensor(output_details[0]['index'])
+            output = dequantize_output(interpreter.get_tensor(output_details[0]['index']), output_details[0])
             print(f"✅ Test with zero input successful!")
             print(f"   Output: {output[0][0]:.4f}")
         
@@ -245,8 +336,12 @@ def convert_keras_to_tflite(keras_model_path='models/stroke_model.keras',
             "output_shape": [int(x) for x in output_details[0]['shape']],
             "input_dtype": str(input_details[0]['dtype']),
             "output_dtype": str(output_details[0]['dtype']),
+            # (scale, zero_point); int8 models expect q = round(x / scale) + zero_point
+            "input_quantization": [float(v) for v in input_details[0]['quantization']],
+            "output_quantization": [float(v) for v in output_details[0]['quantization']],
             "file_size_bytes": int(file_size),
             "file_size_kb": round(file_size/1024, 2),
+            "num_threads": num_threads,
             "expected_features": int(input_details[0]['shape'][1]),
             "original_features": ["age", "hypertension", "heart_disease", "avg_glucose_level", "bmi"],
             "requires_feature_engineering": bool(input_details[0]['shape'][1] > 5),
@@ -302,196 +397,105 @@ def convert_keras_to_tflite(keras_model_path='models/stroke_model.keras',
         traceback.print_exc()
         return False
 
-def create_flutter_helper_code(num_features=14):
-    """Generate sample Flutter/Dart code for using the TFLite model"""
+def convert_keras_to_onnx(keras_model_path='models/stroke_model.keras',
+                          onnx_output_path='models/stroke.onnx',
+                          quantize=True):
+    """
+    Export the BN-folded stroke model to ONNX for onnxruntime inference (server/CPU side)
     
-    flutter_code = f'''
-// Add to pubspec.yaml:
-// dependencies:
-//   tflite_flutter: ^0.10.1
-//
-// flutter:
-//   assets:
-//     - assets/stroke_model.tflite
-//     - assets/stroke_scaler.json
-//     - assets/scaler_complete.json
+    Args:
+        keras_model_path: Path to the .keras model file
+        onnx_output_path: Output path for the float32 .onnx model
+        quantize: Also write a dynamic int8 copy next to it (<name>_int8.onnx)
+    
+    Returns the path of the model to serve (the int8 one when quantized), or None on failure.
+    """
+    
+    print("\n" + "="*70)
+    print("🔄 CONVERTING KERAS MODEL TO ONNX")
+    print("="*70)
+    
+    try:
+        import tf2onnx
+        import onnxruntime as ort
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+    except ImportError:
+        print("❌ tf2onnx / onnxruntime not installed; skipping ONNX export.")
+        return None
+    
+    if not os.path.exists(keras_model_path):
+        print(f"\n❌ Error: Model file not found at '{keras_model_path}'")
+        print("   Please train the model first using train_stroke_model.py")
+        return None
+    
+    # Same BN folding as the TFLite path: the MLP becomes plain Gemm + activation nodes
+    model = load_inference_model(keras_model_path)
+    num_features = model.input_shape[-1]
+    
+    # Dynamic batch dimension, so one session scores single rows and whole test sets
+    os.makedirs(os.path.dirname(onnx_output_path), exist_ok=True)
+    tf2onnx.convert.from_keras(
+        model,
+        input_signature=[tf.TensorSpec([None, num_features], tf.float32, name='input')],
+        opset=17,
+        output_path=onnx_output_path
+    )
+    print(f"✅ ONNX model saved: {onnx_output_path} ({os.path.getsize(onnx_output_path)/1024:.2f} KB)")
+    
+    serve_path = onnx_output_path
+    if quantize:
+        serve_path = onnx_output_path.replace('.onnx', '_int8.onnx')
+        quantize_dynamic(onnx_output_path, serve_path, weight_type=QuantType.QInt8)
+        print(f"✅ Int8 ONNX model saved: {serve_path} ({os.path.getsize(serve_path)/1024:.2f} KB)")
+    
+    # Check the served model against the folded Keras model on real scaled rows
+    sess_options = ort.SessionOptions()
+    sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session = ort.InferenceSession(serve_path, sess_options, providers=['CPUExecutionProvider'])
+    
+    sample = load_calibration_data(num_features)
+    onnx_out = session.run(None, {session.get_inputs()[0].name: sample})[0]
+    keras_out = model.predict(sample, verbose=0)
+    print(f"🧪 Max |onnx - keras| on {len(sample)} rows: {np.abs(onnx_out - keras_out).max():.6f}")
+    
+    return serve_path
+
+def quantize_input(x, details):
+    """Quantize a float32 input for int8 models; float models get it unchanged"""
+    if details['dtype'] != np.int8:
+        return x
+    scale, zero_point = details['quantization']
+    return np.clip(np.round(x / scale) + zero_point, -128, 127).astype(np.int8)
 
-import 'package:flutter/services.dart';
-import 'package:tflite_flutter/tflite_flutter.dart';
-import 'dart:convert';
-import 'dart:math' as math;
+def dequantize_output(y, details):
+    """Dequantize an int8 model output back to float32 probabilities"""
+    if details['dtype'] != np.int8:
+        return y
+    scale, zero_point = details['quantization']
+    return (y.astype(np.float32) - zero_point) * scale
 
-class StrokeRiskPredictor {{
-  Interpreter? _interpreter;
-  List<double>? _mean;
-  List<double>? _std;
-  List<double>? _meanComplete;
-  List<double>? _stdComplete;
-  bool _useFeatureEngineering = false;
-  
-  Future<void> loadModel() async {{
-    try {{
-      // Load TFLite model
-      _interpreter = await Interpreter.fromAsset('assets/stroke_model.tflite');
-      
-      // Check if model uses feature engineering
-      var inputShape = _interpreter!.getInputTensor(0).shape;
-      _useFeatureEngineering = inputShape[1] > 5;
-      
-      print('Model loaded successfully');
-      print('Input shape: ${{inputShape}}');
-      print('Using feature engineering: $_useFeatureEngineering');
-      
-      // Load basic scaler parameters
-      final scalerJson = await rootBundle.loadString('assets/stroke_scaler.json');
-      final scaler = json.decode(scalerJson);
-      _mean = List<double>.from(scaler['mean']);
-      _std = List<double>.from(scaler['std']);
-      
-      // Load complete scaler if using feature engineering
-      if (_useFeatureEngineering) {{
-        try {{
-          final completeScalerJson = await rootBundle.loadString('assets/scaler_complete.json');
-          final completeScaler = json.decode(completeScalerJson);
-          _meanComplete = List<double>.from(completeScaler['mean']);
-          _stdComplete = List<double>.from(completeScaler['std']);
-          print('Complete scaler loaded');
-        }} catch (e) {{
-          print('Warning: Could not load complete scaler: $e');
-        }}
-      }}
-      
-    }} catch (e) {{
-      print('Error loading model: $e');
-      rethrow;
-    }}
-  }}
-  
-  List<double> _computeEngineeredFeatures(
-    double age,
-    double hypertension,
-    double heartDisease,
-    double glucose,
-    double bmi,
-  ) {{
-    return [
-      age * glucose / 100,      // age_glucose
-      bmi * glucose / 100,      // bmi_glucose
-      age * bmi / 100,          // age_bmi
-      hypertension + heartDisease,  // health_risk
-      age * age,                // age_squared
-      bmi * bmi,                // bmi_squared
-      age > 60 ? 2.0 : (age > 40 ? 1.0 : 0.0),  // age_group_risk
-      glucose > 200 ? 2.0 : (glucose > 140 ? 1.0 : 0.0),  // glucose_risk
-      bmi > 30 ? 2.0 : (bmi > 25 ? 1.0 : 0.0),  // bmi_category
-    ];
-  }}
-  
-  double predictStrokeRisk({{
-    required double age,
-    required int hypertension,
-    required int heartDisease,
-    required double glucose,
-    required double bmi,
-  }}) {{
-    if (_interpreter == null || _mean == null || _std == null) {{
-      throw Exception('Model not loaded. Call loadModel() first.');
-    }}
-    
-    // Prepare base input: [age, hypertension, heart_disease, glucose, bmi]
-    List<double> input = [
-      age,
-      hypertension.toDouble(),
-      heartDisease.toDouble(),
-      glucose,
-      bmi
-    ];
-    
-    List<double> scaledInput;
-    
-    if (_useFeatureEngineering && _meanComplete != null && _stdComplete != null) {{
-      // Compute engineered features
-      List<double> engineered = _computeEngineeredFeatures(
-        age, hypertension.toDouble(), heartDisease.toDouble(), glucose, bmi
-      );
-      
-      // Combine all features
-      List<double> allFeatures = [...input, ...engineered];
-      
-      // Scale using complete scaler
-      scaledInput = [];
-      for (int i = 0; i < allFeatures.length; i++) {{
-        scaledInput.add((allFeatures[i] - _meanComplete![i]) / _stdComplete![i]);
-      }}
-    }} else {{
-      // Scale using basic scaler
-      scaledInput = [];
-      for (int i = 0; i < input.length; i++) {{
-        scaledInput.add((input[i] - _mean![i]) / _std![i]);
-      }}
-      
-      // If model expects more features but we don't have complete scaler,
-      // pad with zeros (not ideal, but fallback)
-      var expectedFeatures = _interpreter!.getInputTensor(0).shape[1];
-      while (scaledInput.length < expectedFeatures) {{
-        scaledInput.add(0.0);
-      }}
-    }}
-    
-    // Reshape input to [1, numFeatures]
-    var inputArray = [scaledInput];
-    
-    // Prepare output buffer
-    var output = List.filled(1, List.filled(1, 0.0)).cast<List<double>>();
-    
-    // Run inference
-    _interpreter!.run(inputArray, output);
-    
-    // Return stroke risk as percentage
-    double riskProbability = output[0][0];
-    return riskProbability * 100;
-  }}
-  
-  String getRiskLevel(double riskPercentage) {{
-    if (riskPercentage < 10) return 'Low';
-    if (riskPercentage < 30) return 'Moderate';
-    if (riskPercentage < 60) return 'High';
-    return 'Very High';
-  }}
-  
-  void dispose() {{
-    _interpreter?.close();
-  }}
-}}
+FLUTTER_TEMPLATE = 'assets/flutter_integration.template.dart'
 
-// Usage example:
-void main() async {{
-  final predictor = StrokeRiskPredictor();
-  await predictor.loadModel();
-  
-  double risk = predictor.predictStrokeRisk(
-    age: 65,
-    hypertension: 1,
-    heartDisease: 1,
-    glucose: 200,
-    bmi: 32,
-  );
-  
-  String level = predictor.getRiskLevel(risk);
-  
-  print('Stroke Risk: ${{risk.toStringAsFixed(2)}}%');
-  print('Risk Level: $level');
-  
-  predictor.dispose();
-}}
-'''
+def create_flutter_helper_code(num_features=14):
+    """Generate sample Flutter/Dart code for using the TFLite model"""
+    
+    # The Dart source lives in a checked-in template; only the feature count is filled in
+    with open(FLUTTER_TEMPLATE, 'r') as f:
+        flutter_code = f.read().replace('{NUM_FEATURES}', str(num_features))
+    
+    output_path = 'assets/flutter_integration.dart'
+    if os.path.exists(output_path):
+        with open(output_path, 'r') as f:
+            if f.read() == flutter_code:
+                print(f"\n✅ Flutter integration code up to date: {output_path}")
+                return
     
     # Save Flutter helper code
     os.makedirs('assets', exist_ok=True)
-    with open('assets/flutter_integration.dart', 'w') as f:
+    with open(output_path, 'w') as f:
         f.write(flutter_code)
     
-    print("\n✅ Flutter integration code saved to: assets/flutter_integration.dart")
+    print(f"\n✅ Flutter integration code saved to: {output_path}")
 
 def batch_convert():
     """Convert multiple models with different configurations"""
@@ -500,39 +504,51 @@ def batch_convert():
     print("🔄 BATCH CONVERSION")
     print("="*70)
     
+    keras_model_path = 'models/stroke_model.keras'
     conversions = [
         {
             'name': 'Full Precision',
-            'input': 'models/stroke_model.keras',
+            'input': keras_model_path,
             'output': 'assets/stroke_model.tflite',
             'quantization': False
         },
         {
             'name': 'Quantized (Float16)',
-            'input': 'models/stroke_model.keras',
+            'input': keras_model_path,
             'output': 'assets/stroke_model_quantized.tflite',
             'quantization': True
         }
     ]
     
-    results = []
+    # Load, fold BatchNormalization and export the SavedModel once; every worker
+    # converts from that directory instead of reloading the .keras archive
+    if not os.path.exists(keras_model_path):
+        print(f"\n❌ Error: Model file not found at '{keras_model_path}'")
+        print("   Please train the model first using train_stroke_model.py")
+        return
+    saved_model_dir = export_saved_model(keras_model_path)
     
-    for config in conversions:
-        print(f"\n{'='*70}")
-        print(f"Converting: {config['name']}")
-        print(f"{'='*70}")
-        
-        success = convert_keras_to_tflite(
-            keras_model_path=config['input'],
-            tflite_output_path=config['output'],
-            quantization=config['quantization']
-        )
-        
-        results.append({
-            'name': config['name'],
-            'success': success,
-            'output': config['output']
-        })
+    # TFLite conversion is single-threaded, so run each config in its own process.
+    # spawn (not fork) gives every worker a fresh TensorFlow runtime.
+    max_workers = min(len(conversions), os.cpu_count() or 1)
+    print(f"⚙️  Running {len(conversions)} conversions across {max_workers} processes...")
+    
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [
+            executor.submit(
+                convert_keras_to_tflite,
+                keras_model_path=config['input'],
+                tflite_output_path=config['output'],
+                quantization=config['quantization'],
+                saved_model_dir=saved_model_dir
+            )
+            for config in conversions
+        ]
+        results = [
+            {'name': config['name'], 'success': future.result(), 'output': config['output']}
+            for config, future in zip(conversions, futures)
+        ]
     
     # Summary
     print("\n" + "="*70)
@@ -558,10 +574,14 @@ if __name__ == "__main__":
                         help='Output TFLite model path')
     parser.add_argument('--quantize', action='store_true',
                         help='Enable quantization for smaller file size')
+    parser.add_argument('--int8', action='store_true',
+                        help='Full-integer int8 quantization calibrated on stroke.csv (overrides --quantize)')
     parser.add_argument('--batch', action='store_true',
                         help='Convert multiple versions (full + quantized)')
     parser.add_argument('--flutter-code', action='store_true',
                         help='Generate Flutter integration code')
+    parser.add_argument('--onnx', action='store_true',
+                        help='Also export models/stroke.onnx (+ dynamic int8 copy) for onnxruntime')
     
     args = parser.parse_args()
     
@@ -574,7 +594,7 @@ if __name__ == "__main__":
         success = convert_keras_to_tflite(
             keras_model_path=args.input,
             tflite_output_path=args.output,
-            quantization=args.quantize
+            quantization='int8' if args.int8 else args.quantize
         )
         
         if not success:
@@ -584,4 +604,7 @@ if __name__ == "__main__":
         if args.flutter_code:
             create_flutter_helper_code()
     
+    if args.onnx:
+        convert_keras_to_onnx(keras_model_path=args.input)
+    
     print("\n🎉 All done! Your model is ready for Flutter deployment!")
\ No newline at end of file
@@ -1,17 +1,6 @@
-import os
+import tf_setup  # CPU-only TensorFlow; must come before the tensorflow import
 import tensorflow as tf
 
-# --- CRITICAL FIX: Disable GPU/Metal for Conversion ---
-# The TFLite converter is unstable on Mac GPUs. We force CPU mode.
-os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
-try:
-    # Hide GPU from TensorFlow explicitly
-    tf.config.set_visible_devices([], 'GPU')
-    print("✅ GPU disabled for conversion stability.")
-except:
-    pass
-# ------------------------------------------------------
-
 def convert():
     h5_path = '/Users/kalyan/Client project/Explainable AI/models/pneumonia_model.h5'
     saved_model_dir = '/Users/kalyan/Client project/Explainable AI/models/temp_saved_model'
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import tensorflow as tf
+
+# Conversion helpers shared by the converter scripts (Clinical_Risk_convter.py,
+# convert_stroke_tflite.py). Import after any environment setup those scripts do
+# before TensorFlow initializes (tf_setup, oneDNN flags).
+
+def convert_batchnorm_to_inference(model):
+    """Fold each Dense -> BatchNormalization pair into a single Dense layer.
+    
+    Uses the BN moving statistics: W' = W * gamma / sqrt(var + eps) and
+    b' = (b - mean) * gamma / sqrt(var + eps) + beta. Dropout is an identity
+    at inference, so it is left out of the rebuilt model.
+    """
+    
+    layers = model.layers
+    new_layers = [tf.keras.layers.Input(shape=model.input_shape[1:])]
+    fused_weights = []
+    i = 0
+    
+    while i < len(layers):
+        layer = layers[i]
+        
+        if isinstance(layer, tf.keras.layers.Dense):
+            weights = layer.get_weights()
+            W = weights[0]
+            b = weights[1] if layer.use_bias else np.zeros(W.shape[1], dtype=W.dtype)
+            
+            next_layer = layers[i + 1] if i + 1 < len(layers) else None
+            if isinstance(next_layer, tf.keras.layers.BatchNormalization):
+                # BN can only be folded into the affine part: Dense(relu) -> BN is not W'x + b'
+                if layer.activation is not tf.keras.activations.linear:
+                    raise ValueError(
+                        f"Unsupported layer for BatchNorm fusion: {layer.name} has a non-linear "
+                        f"activation before {next_layer.name}"
+                    )
+                bn_weights = next_layer.get_weights()
+                gamma = bn_weights.pop(0) if next_layer.scale else np.ones_like(b)
+                beta = bn_weights.pop(0) if next_layer.center else np.zeros_like(b)
+                moving_mean, moving_var = bn_weights
+                
+                scale = gamma / np.sqrt(moving_var + next_layer.epsilon)
+                W = W * scale
+                b = (b - moving_mean) * scale + beta
+                print(f"   Fused {layer.name} + {next_layer.name}")
+                i += 1
+            
+            new_layers.append(tf.keras.layers.Dense(
+                layer.units, activation=layer.activation, name=layer.name
+            ))
+            fused_weights.extend([W, b])
+        
+        elif isinstance(layer, tf.keras.layers.Activation):
+            new_layers.append(tf.keras.layers.Activation(layer.activation, name=layer.name))
+        
+        elif not isinstance(layer, tf.keras.layers.Dropout):
+            raise ValueError(f"Unsupported layer for BatchNorm fusion: {layer.name}")
+        
+        i += 1
+    
+    new_model = tf.keras.Sequential(new_layers)
+    new_model.set_weights(fused_weights)
+    
+    # Not compiled: conversion and verification only need the forward pass
+    return new_model
+
+def cached_saved_model(saved_model_dir, save_fn):
+    """Export a SavedModel to saved_model_dir via save_fn(path) unless a complete one is there.
+    
+    save_fn writes into a temporary sibling directory that is moved into place
+    only once it finished, so an interrupted or failed export is never mistaken
+    for a cache hit. Returns True when an existing export was reused.
+    """
+    if os.path.exists(os.path.join(saved_model_dir, 'saved_model.pb')):
+        return True
+    
+    parent = os.path.dirname(saved_model_dir) or '.'
+    os.makedirs(parent, exist_ok=True)
+    shutil.rmtree(saved_model_dir, ignore_errors=True)  # Partial export from an older run
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix=os.path.basename(saved_model_dir) + '.tmp')
+    try:
+        save_fn(tmp_dir)
+        os.replace(tmp_dir, saved_model_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return False
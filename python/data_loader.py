@@ -1,20 +1,138 @@
+import os
+import hashlib
+import numpy as np
+import torch
 from torchvision import datasets, transforms
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, Dataset
+
+def get_dataloaders(data_dir, batch_size=16, use_dali=False, num_workers=None, cache=False):
+    if use_dali:
+        return tuple(
+            DALILoader(f"{data_dir}/{split}", batch_size, shuffle=split == "train")
+            for split in ("train", "val", "test")
+        )
 
-def get_dataloaders(data_dir, batch_size=16):
     transform = transforms.Compose([
         transforms.Resize((224,224)),
-        transforms.Grayscale(num_output_channels=3),
+        transforms.Grayscale(num_output_channels=1),
         transforms.ToTensor(),
-        transforms.Normalize(mean=[0.5]*3, std=[0.5]*3)
+        transforms.Normalize(mean=[0.5], std=[0.5])
     ])
 
-    train_ds = datasets.ImageFolder(f"{data_dir}/train", transform)
-    val_ds   = datasets.ImageFolder(f"{data_dir}/val", transform)
-    test_ds  = datasets.ImageFolder(f"{data_dir}/test", transform)
+    # The transform is deterministic, so cache=True decodes each split once into a memmap
+    dataset = CachedImageFolder if cache else datasets.ImageFolder
+    train_ds = dataset(f"{data_dir}/train", transform)
+    val_ds   = dataset(f"{data_dir}/val", transform)
+    test_ds  = dataset(f"{data_dir}/test", transform)
+
+    # Decode/transform in worker processes, overlapped with the training step;
+    # pinned batches let .to("cuda", non_blocking=True) DMA straight from host memory
+    if num_workers is None:
+        num_workers = (os.cpu_count() or 2) // 2
+    loader_kwargs = dict(num_workers=num_workers, pin_memory=True)
+    if num_workers > 0:
+        loader_kwargs.update(persistent_workers=True, prefetch_factor=4)
 
     return (
-        DataLoader(train_ds, batch_size, shuffle=True),
-        DataLoader(val_ds, batch_size),
-        DataLoader(test_ds, batch_size)
+        DataLoader(train_ds, batch_size, shuffle=True, **loader_kwargs),
+        DataLoader(val_ds, batch_size, **loader_kwargs),
+        DataLoader(test_ds, batch_size, **loader_kwargs)
     )
+
+class CachedImageFolder(Dataset):
+    """ImageFolder whose transformed tensors are cached in a float16 memmap.
+
+    The first run decodes and transforms every image once into
+    <root>/cache.bin; later epochs and runs slice the memmap instead of
+    decoding JPEGs. Only valid for deterministic transforms (no augmentation).
+    A sidecar <root>/cache.key (file list, mtimes, labels and repr(transform))
+    triggers a rebuild when the images or the transform change.
+    """
+
+    def __init__(self, root, transform, sample_shape=(1, 224, 224)):
+        folder = datasets.ImageFolder(root, transform)
+        self.classes = folder.classes
+        self.targets = folder.targets
+        self.shape = (len(folder), *sample_shape)
+        self.cache_path = os.path.join(root, 'cache.bin')
+        self._data = None
+
+        key_path = os.path.join(root, 'cache.key')
+        key = self._cache_key(root, folder.samples, transform, self.shape)
+        stored_key = None
+        if os.path.exists(key_path):
+            with open(key_path) as f:
+                stored_key = f.read()
+
+        expected_bytes = int(np.prod(self.shape)) * np.dtype(np.float16).itemsize
+        if (stored_key != key or not os.path.exists(self.cache_path)
+                or os.path.getsize(self.cache_path) != expected_bytes):
+            # Write to a temp file first so an interrupted run never leaves a valid-looking cache
+            tmp_path = self.cache_path + '.tmp'
+            data = np.memmap(tmp_path, dtype=np.float16, mode='w+', shape=self.shape)
+            for i in range(len(folder)):
+                data[i] = folder[i][0].numpy()
+            data.flush()
+            del data
+            os.replace(tmp_path, self.cache_path)
+            # Written last: a run interrupted before this point rebuilds next time
+            with open(key_path, 'w') as f:
+                f.write(key)
+
+    @staticmethod
+    def _cache_key(root, samples, transform, shape):
+        """Digest of everything the cached tensors depend on"""
+        digest = hashlib.sha1(f"{transform!r}|{shape}".encode())
+        for path, target in samples:
+            digest.update(f"{os.path.relpath(path, root)}|{os.stat(path).st_mtime_ns}|{target}\n".encode())
+        return digest.hexdigest()
+
+    def __getstate__(self):
+        # Workers reopen the memmap instead of receiving a pickled copy of the array
+        return {**self.__dict__, '_data': None}
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, idx):
+        if self._data is None:
+            self._data = np.memmap(self.cache_path, dtype=np.float16, mode='r', shape=self.shape)
+        return torch.from_numpy(self._data[idx].astype(np.float32)), self.targets[idx]
+
+class DALILoader:
+    """GPU version of the torchvision pipeline above, built on NVIDIA DALI.
+
+    JPEG decode (nvJPEG), resize and normalize all run on the GPU and batches
+    arrive as CUDA tensors. Class labels follow ImageFolder's sorted
+    subdirectory order, and iteration yields (images, labels) like a DataLoader.
+    """
+
+    def __init__(self, root, batch_size, shuffle=False, device_id=0, num_threads=4):
+        from nvidia.dali import pipeline_def, fn, types
+        from nvidia.dali.plugin.pytorch import DALIClassificationIterator, LastBatchPolicy
+
+        @pipeline_def(batch_size=batch_size, num_threads=num_threads, device_id=device_id)
+        def pipeline():
+            jpegs, labels = fn.readers.file(file_root=root, random_shuffle=shuffle, name="Reader")
+            images = fn.decoders.image(jpegs, device="mixed", output_type=types.GRAY)
+            images = fn.resize(images, resize_x=224, resize_y=224)
+            # ToTensor + Normalize(0.5, 0.5) in 0-255 pixel units
+            images = fn.crop_mirror_normalize(
+                images, dtype=types.FLOAT, output_layout="CHW",
+                mean=[127.5], std=[127.5]
+            )
+            return images, labels.gpu()
+
+        pipe = pipeline()
+        pipe.build()
+        self.iterator = DALIClassificationIterator(
+            pipe, reader_name="Reader", auto_reset=True,
+            last_batch_policy=LastBatchPolicy.PARTIAL
+        )
+
+    def __len__(self):
+        return len(self.iterator)
+
+    def __iter__(self):
+        for batch in self.iterator:
+            yield batch[0]["data"], batch[0]["label"].squeeze(-1).long()
@@ -1,21 +1,11 @@
+import tf_setup  # CPU-only TensorFlow; must come before the tensorflow import
 import os
-
-# --- CRITICAL FIX: Disable GPU for Conversion ---
-# This forces TensorFlow to use CPU, avoiding the Metal/LLVM crash on Mac
-os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
 import tensorflow as tf
-
-# Try to disable GPU visibility programmatically as a backup
-try:
-    tf.config.set_visible_devices([], 'GPU')
-    print("✅ Disabled GPU for TFLite conversion stability")
-except:
-    pass
-
 import numpy as np
 import json
+from pneumonia_input import write_input_spec
 
-def export_model():
+def export_model(write_json=False):
     # 1. Load your existing trained model
     MODEL_PATH = 'models/pneumonia_model.h5' 
     if not os.path.exists(MODEL_PATH):
@@ -30,51 +20,55 @@ def export_model():
         return
 
     # 2. Identify The Last Convolutional Layer
-    last_conv_layer = None
-    for layer in reversed(model.layers):
-        try:
-            # Check if layer output is 4D: (Batch, Height, Width, Channels)
-            if len(layer.output.shape) == 4:
-                last_conv_layer = layer.name
-                print(f"🔍 Found Feature Layer: {last_conv_layer} {layer.output.shape}")
-                break
-        except AttributeError:
-            continue
-
-    if last_conv_layer is None:
+    # Last layer whose output is 4D: (Batch, Height, Width, Channels). getattr returns ()
+    # for layers without a single defined output shape instead of raising per layer
+    feature_layer = next(
+        (layer for layer in reversed(model.layers) if len(getattr(layer, 'output_shape', ())) == 4),
+        None
+    )
+
+    if feature_layer is None:
         print("❌ Critical Error: Could not find a 4D Convolutional layer.")
         return
 
-    # 3. Create Multi-Output Model
-    # Output 1: Prediction [1, 1]
-    # Output 2: Feature Map [1, 7, 7, 1280]
-    multi_out_model = tf.keras.models.Model(
-        inputs=model.input,
-        outputs=[model.output, model.get_layer(last_conv_layer).output]
-    )
+    last_conv_layer = feature_layer.name
+    print(f"🔍 Found Feature Layer: {last_conv_layer} {feature_layer.output_shape}")
 
-    # 4. Prepare Concrete Function (The Fix for LLVM Error)
-    # We define exactly what the input looks like so TFLite doesn't have to guess
-    run_model = tf.function(lambda x: multi_out_model(x))
-    
-    # Create a concrete function with a fixed input signature
-    # Assuming input is float32 and shape (1, 224, 224, 3)
-    concrete_func = run_model.get_concrete_function(
-        tf.TensorSpec(multi_out_model.inputs[0].shape, multi_out_model.inputs[0].dtype)
+    # 3. Create Fused-Output Model
+    # Single output [1, 7*7*1280 + 1]: the flattened feature map followed by the prediction,
+    # so the client does one output copy instead of two
+    feature_map = model.get_layer(last_conv_layer).output
+    fused_output = tf.keras.layers.Concatenate(axis=-1)(
+        [tf.keras.layers.Flatten()(feature_map), model.output]
     )
-
-    # 5. Convert to TFLite
-    print("⏳ Converting to TFLite (via Concrete Function)...")
-    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_func])
+    multi_out_model = tf.keras.models.Model(inputs=model.input, outputs=fused_output)
+
+    # 4. Convert to TFLite
+    if os.environ.get("XAI_USE_CONCRETE_FUNCTION") == "1":
+        # Fallback for hosts that still hit the LLVM crash: trace an explicit signature
+        run_model = tf.function(lambda x: multi_out_model(x))
+        concrete_func = run_model.get_concrete_function(
+            tf.TensorSpec(multi_out_model.inputs[0].shape, multi_out_model.inputs[0].dtype)
+        )
+        print("⏳ Converting to TFLite (via Concrete Function)...")
+        converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_func])
+    else:
+        # The converter uses the Keras model's own call signature, no extra retrace
+        print("⏳ Converting to TFLite (from Keras model)...")
+        converter = tf.lite.TFLiteConverter.from_keras_model(multi_out_model)
     
     # OPTIONAL: Optimizations (Try commenting this out if it still fails)
+    # float16 weights: half the fp32 size, and unlike dynamic-range int8 there are no
+    # runtime dequantize ops, so the GPU/NNAPI delegates can run the whole graph
     converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.target_spec.supported_types = [tf.float16]
     
     try:
         tflite_model = converter.convert()
     except Exception as e:
         print("⚠️ Optimization failed, trying without optimization...")
         converter.optimizations = []
+        converter.target_spec.supported_types = []
         tflite_model = converter.convert()
 
     # Ensure assets folder exists
@@ -84,29 +78,51 @@ def export_model():
     tflite_path = os.path.join(assets_dir, 'pneumonia_xai_model.tflite')
     with open(tflite_path, 'wb') as f:
         f.write(tflite_model)
-    print(f"✅ Saved Multi-Output TFLite Model: {tflite_path}")
+    print(f"✅ Saved Fused-Output TFLite Model: {tflite_path} ({os.path.getsize(tflite_path)/1024/1024:.2f} MB)")
+    write_input_spec(model, assets_dir)
 
-    # 6. Extract & Save Classifier Weights
+    # 5. Extract & Save Classifier Weights
     dense_layer = model.layers[-1] 
-    weights_list = []
 
     try:
         weights = dense_layer.get_weights()[0] # Shape: (1280, 1) or (1280, 2)
         
         if len(weights.shape) > 1 and weights.shape[1] > 1:
             # If binary classification (2 output nodes), take the "Pneumonia" column (usually index 1)
-            weights_list = weights[:, 1].flatten().tolist()
+            weights = weights[:, 1].flatten()
         else:
             # If binary classification (1 output node)
-            weights_list = weights.flatten().tolist()
-
-        json_path = os.path.join(assets_dir, 'pneumonia_weights.json')
-        with open(json_path, 'w') as f:
-            json.dump({'weights': weights_list}, f)
-        print(f"✅ Saved Weights to JSON: {json_path}")
+            weights = weights.flatten()
+
+        # Symmetric int8 with one global scale (w ~= weights_i8 * scale): the CAM is
+        # normalized to its max on the client, so the precision loss is invisible
+        scale = float(np.max(np.abs(weights))) / 127.0 or 1.0
+        weights_i8 = np.round(weights / scale).astype(np.int8)
+
+        # Raw blob: little-endian float32 scale, then one int8 per channel; the client
+        # views it as an Int8List with no text parsing
+        bin_path = os.path.join(assets_dir, 'pneumonia_weights.bin')
+        with open(bin_path, 'wb') as f:
+            f.write(np.array([scale], dtype='<f4').tobytes())
+            f.write(weights_i8.tobytes())
+        print(f"✅ Saved int8 Weights: {bin_path} (scale={scale:.6g})")
+
+        if write_json:
+            # Human-readable copy for debugging
+            json_path = os.path.join(assets_dir, 'pneumonia_weights.json')
+            with open(json_path, 'w') as f:
+                json.dump({'weights_i8': weights_i8.tolist(), 'scale': scale}, f)
+            print(f"✅ Saved int8 Weights to JSON: {json_path}")
 
     except Exception as e:
         print(f"❌ Error extracting weights: {e}")
 
 if __name__ == "__main__":
-    export_model()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Export the offline XAI pneumonia model for Flutter')
+    parser.add_argument('--json', action='store_true',
+                        help='Also write the classifier weights as JSON (debugging)')
+    args = parser.parse_args()
+
+    export_model(write_json=args.json)
\ No newline at end of file
@@ -1,8 +1,48 @@
-import os
+import tf_setup  # 1. Force CPU (Critical for Mac Stability); must come before the tensorflow import
 import tensorflow as tf
+import glob
+import shutil
+import os
+import tempfile
+from collections import Counter
+from pneumonia_input import pixel_transform, write_input_spec
+
+CALIBRATION_GLOB = '../data/chest_xray/val/*/*.jpeg'
+NUM_CALIBRATION_SAMPLES = 100
+
+def load_calibration_image(path):
+    img = tf.io.decode_jpeg(tf.io.read_file(path), channels=3)
+    return tf.image.resize(img, (224, 224))  # Raw 0-255 pixels
+
+def make_representative_dataset(scale, offset):
+    """Real validation X-rays for INT8 calibration, decoded in parallel by tf.data.
 
-# 1. Force CPU (Critical for Mac Stability)
-os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
+    Pixels go through the model's own input transform (pneumonia_input.pixel_transform).
+    """
+    def representative_dataset():
+        dataset = (
+            tf.data.Dataset.from_tensor_slices(sorted(glob.glob(CALIBRATION_GLOB))[:NUM_CALIBRATION_SAMPLES])
+            .map(lambda path: load_calibration_image(path) * scale + offset,
+                 num_parallel_calls=tf.data.AUTOTUNE)
+            .batch(1)
+            .prefetch(tf.data.AUTOTUNE)
+        )
+        for batch in dataset.as_numpy_iterator():
+            yield [batch]
+    return representative_dataset
+
+def print_op_summary(tflite_model):
+    """List the ops in the converted model so delegate coverage can be checked before deploying.
+
+    GpuDelegate/NnApiDelegate only pay off when they take the whole graph;
+    any op they don't support splits it and shuttles tensors back to the CPU.
+    """
+    interpreter = tf.lite.Interpreter(model_content=tflite_model)
+    interpreter.allocate_tensors()
+    ops = Counter(op['op_name'] for op in interpreter._get_ops_details())
+    print("\n🔍 Ops in converted model (check against the GPU/NNAPI delegate support lists):")
+    for name, count in sorted(ops.items()):
+        print(f"   {name}: {count}")
 
 def convert_robust():
     h5_path = '../models/pneumonia_model.h5'
@@ -15,25 +55,32 @@ def convert_robust():
         print(f"Error loading model: {e}")
         return
 
-    # 2. Create a 'Concrete Function'
-    # This effectively freezes the model into a static graph with a fixed input shape.
-    # It bypasses the dynamic reading errors you are seeing.
-    print("2. Generating Concrete Function...")
-    
-    @tf.function
-    def inference_func(input_data):
-        return model(input_data)
-    
-    # Define the exact input shape: [Batch=1, Height=224, Width=224, Channels=3]
-    input_spec = tf.TensorSpec([1, 224, 224, 3], tf.float32)
-    concrete_func = inference_func.get_concrete_function(input_spec)
+    # 2. Export a SavedModel with a fixed-shape serving signature
+    # Converting from a SavedModel lets Grappler fold constants/batchnorm before TFLite sees
+    # the graph; the fixed [Batch=1, Height=224, Width=224, Channels=3] input avoids dynamic shapes.
+    print("2. Exporting SavedModel...")
+    serving_fn = tf.function(lambda x: model(x, training=False)).get_concrete_function(
+        tf.TensorSpec([1, 224, 224, 3], tf.float32)
+    )
+    saved_model_dir = tempfile.mkdtemp()
+    tf.saved_model.save(model, saved_model_dir, signatures={'serving_default': serving_fn})
 
-    # 3. Convert using the Concrete Function
+    # 3. Convert from the SavedModel
     print("3. Converting...")
-    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_func])
+    converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir)
     
-    # Standard optimizations
+    # Full-integer INT8 quantization (weights + activations, int8 I/O).
+    # Without calibration images we fall back to dynamic-range (weights only).
     converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if glob.glob(CALIBRATION_GLOB):
+        converter.representative_dataset = make_representative_dataset(*pixel_transform(model))
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    else:
+        print(f"⚠️ No calibration images at {CALIBRATION_GLOB}; using dynamic-range quantization.")
+        # Builtins only: SELECT_TF_OPS (Flex) ops can't run on XNNPACK or the GPU/NNAPI delegates
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS]
     
     try:
         tflite_model = converter.convert()
@@ -42,11 +89,15 @@ def convert_robust():
         with open(tflite_path, 'wb') as f:
             f.write(tflite_model)
         print(f"\n✅ SUCCESS! Model saved to {tflite_path}")
-        print("👉 Copy this file to your Flutter 'assets/' folder.")
+        write_input_spec(model, os.path.dirname(tflite_path))
+        print("👉 Copy both files to your Flutter 'assets/' folder.")
+        print_op_summary(tflite_model)
         
     except Exception as e:
         print(f"\n❌ Conversion failed: {e}")
         print("Alternative: Upload your 'pneumonia_model.h5' to Google Colab and convert it there.")
+    finally:
+        shutil.rmtree(saved_model_dir, ignore_errors=True)
 
 if __name__ == "__main__":
     convert_robust()
\ No newline at end of file
@@ -1,32 +1,33 @@
 import torch
-import cv2
-import numpy as np
+import torch.nn.functional as F
 
 class GradCAM:
     def __init__(self, model, target_layer):
         self.model = model
-        self.gradients = None
         self.activations = None
 
         target_layer.register_forward_hook(self.save_activation)
-        target_layer.register_backward_hook(self.save_gradient)
 
     def save_activation(self, module, input, output):
-        self.activations = output
+        # Plain inference forwards (no_grad) through the same model are not kept alive
+        if torch.is_grad_enabled():
+            self.activations = output
 
-    def save_gradient(self, module, grad_input, grad_output):
-        self.gradients = grad_output[0]
-
-    def generate(self, x, class_idx):
+    def generate(self, x, class_idx, size=(224,224)):
         output = self.model(x)
-        self.model.zero_grad()
-        output[:, class_idx].backward()
+        activations, self.activations = self.activations, None
+
+        # Differentiate only back to the target layer: nothing below it runs backward,
+        # no parameter .grad buffers fill up, and the graph is freed (retain_graph=False)
+        gradients, = torch.autograd.grad(output[:, class_idx].sum(), activations)
+        del output
 
-        weights = self.gradients.mean(dim=[2,3], keepdim=True)
-        cam = (weights * self.activations).sum(dim=1)
+        with torch.no_grad():
+            # Accumulate in FP32 even if the forward/backward ran under FP16 autocast
+            weights = gradients.float().mean(dim=(2,3))
+            cam = torch.einsum('bc,bchw->bhw', weights, activations.float()).clamp_min_(0)
 
-        cam = cam.relu()
-        cam = cam[0].cpu().numpy()
-        cam = cv2.resize(cam, (224,224))
-        cam = cam / cam.max()
-        return cam
+            # Upsample and normalize on the model's device; returns a `size` tensor in [0, 1]
+            cam = F.interpolate(cam.unsqueeze(1), size=size, mode="bilinear", align_corners=False).squeeze(1)
+            cam /= cam.amax(dim=(1,2), keepdim=True).clamp_min(1e-8)
+        return cam[0]
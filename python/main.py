@@ -1,46 +1,102 @@
 from fastapi import FastAPI, File, UploadFile
 import tensorflow as tf
 import numpy as np
-from PIL import Image
-import io
 import cv2
 import base64
-from xai_utils import make_gradcam_heatmap, process_heatmap_overlay
+import asyncio
+import os
+import threading
+from xai_utils import build_gradcam_model, make_gradcam_heatmap, process_heatmap_overlay
+from pneumonia_input import pixel_transform, read_input_spec
 
 app = FastAPI()
 
 # Load the trained model
 # Ensure the path matches where train.py saved it
 MODEL_PATH = "../models/pneumonia_model.h5"
-model = tf.keras.models.load_model(MODEL_PATH)
+model = tf.keras.models.load_model(MODEL_PATH)  # Still needed for Grad-CAM gradients
+# Warm up so the first real request doesn't pay the tracing cost
+model(tf.zeros([1, 224, 224, 3], tf.float32), training=False)
+# Raw pixels for models with an in-graph Rescaling layer, 1./255 for older exports
+PIXEL_SCALE, PIXEL_OFFSET = pixel_transform(model)
+
+# Grad-CAM model built once; "out_relu" is the last Conv layer in MobileNetV2.
+# The traced graph is specialized to a single 224x224 RGB image and XLA-compiled,
+# so forward, backward and the heatmap reduction fuse into one program.
+gradcam_model = build_gradcam_model(model, last_conv_layer_name="out_relu")
+gradcam_heatmap = tf.function(
+    lambda x: make_gradcam_heatmap(x, gradcam_model),
+    input_signature=[tf.TensorSpec([1, 224, 224, 3], tf.float32)],
+    jit_compile=True
+)
+# Compile at startup rather than on the first request
+gradcam_heatmap(tf.zeros([1, 224, 224, 3], tf.float32))
+
+# Scoring runs on a persistent TFLite interpreter (XNNPACK CPU kernels) instead of model.predict
+TFLITE_PATH = "../models/pneumonia_model.tflite"
+interpreter = None
+if os.path.exists(TFLITE_PATH):
+    interpreter = tf.lite.Interpreter(model_path=TFLITE_PATH, num_threads=os.cpu_count())
+    interpreter.allocate_tensors()
+    input_details = interpreter.get_input_details()[0]
+    output_details = interpreter.get_output_details()[0]
+    # The .tflite may be an older export than the .h5: use the spec written next to it
+    TFLITE_PIXEL_SCALE, TFLITE_PIXEL_OFFSET = read_input_spec(os.path.dirname(TFLITE_PATH))
+# The Interpreter is not thread-safe; one invoke at a time per worker, run off the event loop
+interpreter_lock = threading.Lock()
+
+def _tflite_invoke(data):
+    with interpreter_lock:
+        interpreter.set_tensor(input_details['index'], data)
+        interpreter.invoke()
+        return interpreter.get_tensor(output_details['index'])
+
+async def tflite_predict(pixels):
+    """Score a (1, 224, 224, 3) float32 batch of raw 0-255 pixels"""
+    if interpreter is None:
+        # No converted model yet: call the Keras model directly (model.predict has heavy per-call overhead)
+        img_batch = pixels * np.float32(PIXEL_SCALE) + np.float32(PIXEL_OFFSET)
+        return await asyncio.to_thread(lambda: model(img_batch, training=False).numpy())
+
+    data = pixels * np.float32(TFLITE_PIXEL_SCALE) + np.float32(TFLITE_PIXEL_OFFSET)
+    if input_details['dtype'] == np.int8:
+        # Full-int8 model from fix_and_convert.py
+        scale, zero_point = input_details['quantization']
+        data = np.clip(np.round(data / scale + zero_point), -128, 127).astype(np.int8)
+    output = await asyncio.to_thread(_tflite_invoke, data)
+    if output_details['dtype'] == np.int8:
+        scale, zero_point = output_details['quantization']
+        output = (output.astype(np.float32) - zero_point) * scale
+    return output
 
 @app.post("/predict")
 async def predict(file: UploadFile = File(...)):
     # 1. Read and Process Image
     contents = await file.read()
-    image = Image.open(io.BytesIO(contents)).convert('RGB')
-    image = image.resize((224, 224))
-    
-    img_array = np.array(image)
+    # Decode, color-convert and resize with OpenCV's SIMD kernels
+    img_array = cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+    img_array = cv2.cvtColor(img_array, cv2.COLOR_BGR2RGB)
+    img_array = cv2.resize(img_array, (224, 224), interpolation=cv2.INTER_AREA)
     
-    # IMPORTANT: Preprocessing must match training (rescale 1./255)
-    img_batch = np.expand_dims(img_array, axis=0) / 255.0
+    pixels = img_array.astype(np.float32).reshape(1, 224, 224, 3)
 
-    # 2. Make Prediction
-    prediction = model.predict(img_batch)
+    # 2. Make Prediction (tflite_predict applies the scored model's own pixel transform)
+    prediction = await tflite_predict(pixels)
     score = float(prediction[0][0]) # 0.0 to 1.0
     
     # 3. Generate Explainability (Grad-CAM)
-    # "out_relu" is the last Conv layer in MobileNetV2
-    heatmap = make_gradcam_heatmap(img_batch, model, last_conv_layer_name="out_relu")
+    # Grad-CAM runs on the Keras model, so it gets the .h5's transform (pneumonia_input.pixel_transform)
+    img_batch = pixels * np.float32(PIXEL_SCALE) + np.float32(PIXEL_OFFSET)
+    heatmap = gradcam_heatmap(img_batch)[0].numpy()
     
     # Overlay heatmap on original image
     # Note: process_heatmap_overlay expects unscaled image (0-255)
     overlay_img = process_heatmap_overlay(img_array, heatmap)
     
     # Convert to Base64 to send to Flutter
-    _, buffer = cv2.imencode('.jpg', overlay_img)
-    heatmap_base64 = base64.b64encode(buffer).decode('utf-8')
+    # Quality 75 + optimized Huffman tables: much smaller payload, no visible loss on a heatmap
+    _, buffer = cv2.imencode('.jpg', overlay_img, [cv2.IMWRITE_JPEG_QUALITY, 75, cv2.IMWRITE_JPEG_OPTIMIZE, 1])
+    heatmap_base64 = base64.b64encode(buffer).decode('ascii')
 
     # Logic: Closer to 0 is Normal, Closer to 1 is Pneumonia
     result = "PNEUMONIA" if score > 0.5 else "NORMAL"
@@ -3,10 +3,28 @@ import torch.nn as nn
 from torchvision import models
 
 class PneumoniaModel(nn.Module):
-    def __init__(self):
+    in_channels = 1  # chest X-rays are grayscale
+
+    def __init__(self, weights=models.ResNet18_Weights.IMAGENET1K_V1):
         super().__init__()
-        self.model = models.resnet18(pretrained=True)
+        # weights=None skips the ImageNet download when a trained checkpoint is loaded right after
+        self.model = models.resnet18(weights=weights)
         self.model.fc = nn.Linear(512, 2)
 
+        # Single-channel stem: the ImageNet conv1 kernels summed over RGB give the
+        # same activations on a grayscale image as the old 3x-replicated input
+        rgb_conv = self.model.conv1
+        self.model.conv1 = nn.Conv2d(self.in_channels, rgb_conv.out_channels, kernel_size=rgb_conv.kernel_size,
+                                     stride=rgb_conv.stride, padding=rgb_conv.padding, bias=False)
+        with torch.no_grad():
+            self.model.conv1.weight.copy_(rgb_conv.weight.sum(dim=1, keepdim=True))
+
+    def load_state_dict(self, state_dict, *args, **kwargs):
+        # Checkpoints from the 3-channel model load with the same folding
+        weight = state_dict.get('model.conv1.weight')
+        if weight is not None and weight.shape[1] == 3:
+            state_dict = {**state_dict, 'model.conv1.weight': weight.sum(dim=1, keepdim=True)}
+        return super().load_state_dict(state_dict, *args, **kwargs)
+
     def forward(self, x):
         return self.model(x)
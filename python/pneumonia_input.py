@@ -0,0 +1,35 @@
+import json
+import os
+import tensorflow as tf
+
+# Sidecar written next to every exported pneumonia model; the Flutter screens read it
+# from assets/ so the app follows whichever model is bundled
+INPUT_SPEC_NAME = 'pneumonia_input.json'
+
+def pixel_transform(model):
+    """(scale, offset) that maps raw 0-255 pixels to this model's input: x * scale + offset.
+
+    Models from the current train.py normalize inside the graph (a Rescaling layer) and
+    take raw pixels; older exports were trained on 1./255 inputs with no such layer.
+    """
+    if any(isinstance(layer, tf.keras.layers.Rescaling) for layer in model.layers):
+        return 1.0, 0.0
+    return 1.0 / 255.0, 0.0
+
+def write_input_spec(model, out_dir):
+    """Write the model's pixel transform as <out_dir>/pneumonia_input.json"""
+    scale, offset = pixel_transform(model)
+    path = os.path.join(out_dir, INPUT_SPEC_NAME)
+    with open(path, 'w') as f:
+        json.dump({'scale': scale, 'offset': offset}, f, indent=2)
+    print(f"✅ Saved input spec: {path} (pixel * {scale:.6g} + {offset:g})")
+    return path
+
+def read_input_spec(out_dir):
+    """(scale, offset) from <out_dir>/pneumonia_input.json; exports older than the spec get 1./255"""
+    path = os.path.join(out_dir, INPUT_SPEC_NAME)
+    if not os.path.exists(path):
+        return 1.0 / 255.0, 0.0
+    with open(path) as f:
+        spec = json.load(f)
+    return float(spec['scale']), float(spec['offset'])
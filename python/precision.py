@@ -0,0 +1,26 @@
+import tensorflow as tf
+
+# Mixed precision is for fit() on GPU only. Saved models and QAT use float32 copies:
+# CPU consumers (main.py, the TFLite converters) would otherwise reload float16 layers
+# and Cast ops, and tfmot's FakeQuant ops only accept float32.
+
+def float32_copy(model, wrap=None):
+    """Rebuild model with float32 layers and copy its weights over.
+
+    Switches the global policy to float32 first, so anything built afterwards
+    is float32 too. wrap(layer), if given, is applied to every rebuilt layer
+    (e.g. tfmot's quantize_annotate_layer).
+    """
+    tf.keras.mixed_precision.set_global_policy('float32')
+
+    def clone(layer):
+        # Layer configs carry their dtype policy explicitly, so override it
+        config = layer.get_config()
+        config['dtype'] = 'float32'
+        layer = layer.__class__.from_config(config)
+        return wrap(layer) if wrap else layer
+
+    model_fp32 = tf.keras.models.clone_model(model, clone_function=clone)
+    # Mixed-precision layers keep float32 variables, so the weights copy over as-is
+    model_fp32.set_weights(model.get_weights())
+    return model_fp32
@@ -0,0 +1,18 @@
+import os
+
+# --- CRITICAL FIX: Disable GPU/Metal for Conversion ---
+# The TFLite converter is unstable on Mac GPUs (Metal/LLVM crash), so every
+# conversion script runs on CPU. Import this module before tensorflow: the
+# environment variable must be set before TensorFlow initializes its devices,
+# and Python's module cache makes this run once per process however many
+# converter modules import it.
+os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
+
+import tensorflow as tf
+
+try:
+    # Hide GPU from TensorFlow explicitly
+    tf.config.set_visible_devices([], 'GPU')
+    print("✅ GPU disabled for conversion stability.")
+except:
+    pass
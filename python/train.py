@@ -1,55 +1,79 @@
 import tensorflow as tf
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout
+from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout, Input, Rescaling
 from tensorflow.keras.models import Model
 from tensorflow.keras.optimizers import Adam
 import os
+from precision import float32_copy
+
+# Mixed precision: convs run in float16 on GPU tensor cores with float32 master weights.
+# Keras wraps the optimizer in a LossScaleOptimizer automatically at compile time.
+if tf.config.list_physical_devices('GPU'):
+    tf.keras.mixed_precision.set_global_policy('mixed_float16')
 
 # --- Configuration ---
 IMG_SIZE = (224, 224)
 BATCH_SIZE = 32
+# MobileNetV2 width multiplier: 0.75 cuts ~30% of the FLOPs of 1.0 at 224px.
+# The final conv stays 1280 channels for alpha <= 1, so the head and Grad-CAM layer are unchanged.
+ALPHA = 0.75
 EPOCHS = 10
 DATA_DIR = '/Users/kalyan/Client project/Explainable AI/python/data/chest_xray' # Ensure this path is correct
 
 # --- 1. Data Preparation ---
-# Important: The model expects inputs scaled 0-1 (rescale=1./255)
-train_datagen = ImageDataGenerator(
-    rescale=1./255,
-    rotation_range=15,
-    zoom_range=0.2,
-    horizontal_flip=True
-)
+# Important: The model takes raw 0-255 pixels; its first layer rescales them to [-1, 1]
+# JPEG decode, augmentation and batching run inside tf.data, in parallel with training
+AUTOTUNE = tf.data.AUTOTUNE
+augment = tf.keras.Sequential([
+    tf.keras.layers.RandomFlip('horizontal'),
+    tf.keras.layers.RandomRotation(15 / 360),
+    tf.keras.layers.RandomZoom(0.2),
+    tf.keras.layers.RandomBrightness(0.2, value_range=(0, 255)),
+])
 
-val_datagen = ImageDataGenerator(rescale=1./255)
+def load_split(split, training=False):
+    ds = tf.keras.utils.image_dataset_from_directory(
+        os.path.join(DATA_DIR, split),
+        image_size=IMG_SIZE,
+        batch_size=None,
+        label_mode='binary',  # 0=Normal, 1=Pneumonia
+        shuffle=False
+    )
+    # Cache decoded images as uint8 so later epochs skip JPEG decode entirely
+    ds = ds.map(lambda x, y: (tf.cast(x, tf.uint8), y), num_parallel_calls=AUTOTUNE).cache()
+    if training:
+        # Files come back sorted by class, so shuffle across the whole split (a small window
+        # would yield single-class batches); the buffer holds the cached uint8 tensors
+        ds = ds.shuffle(ds.cardinality(), reshuffle_each_iteration=True)
+        # Let parallel map workers hand back batches out of order instead of stalling on the slowest
+        options = tf.data.Options()
+        options.deterministic = False
+        ds = ds.with_options(options)
+    ds = ds.batch(BATCH_SIZE).map(lambda x, y: (tf.cast(x, tf.float32), y), num_parallel_calls=AUTOTUNE)
+    if training:
+        ds = ds.map(lambda x, y: (augment(x, training=True), y), num_parallel_calls=AUTOTUNE)
+    return ds.prefetch(AUTOTUNE)
 
 print("Loading Data...")
-train_generator = train_datagen.flow_from_directory(
-    os.path.join(DATA_DIR, 'train'),
-    target_size=IMG_SIZE,
-    batch_size=BATCH_SIZE,
-    class_mode='binary'  # 0=Normal, 1=Pneumonia
-)
-
-val_generator = val_datagen.flow_from_directory(
-    os.path.join(DATA_DIR, 'val'),
-    target_size=IMG_SIZE,
-    batch_size=BATCH_SIZE,
-    class_mode='binary'
-)
+train_ds = load_split('train', training=True)
+val_ds = load_split('val')
 
 # --- 2. Model Architecture ---
 # MobileNetV2 is great for X-rays. We exclude the top to add our own classifier.
-base_model = MobileNetV2(weights='imagenet', include_top=False, input_shape=(224, 224, 3))
+# MobileNetV2's preprocess_input ([-1, 1]) is built into the graph as the first layer, so
+# callers pass raw pixels and TFLite can fold the scale into the first conv
+inputs = Input(shape=(224, 224, 3))
+x = Rescaling(1./127.5, offset=-1)(inputs)
+base_model = MobileNetV2(weights='imagenet', include_top=False, input_tensor=x, alpha=ALPHA)
 base_model.trainable = False  # Freeze base model initially
 
 x = base_model.output
 x = GlobalAveragePooling2D()(x)
 x = Dense(128, activation='relu')(x)
 x = Dropout(0.3)(x)
-predictions = Dense(1, activation='sigmoid')(x)
+predictions = Dense(1, activation='sigmoid', dtype='float32')(x)  # Keep the output/loss in float32
 
-model = Model(inputs=base_model.input, outputs=predictions)
+model = Model(inputs=inputs, outputs=predictions)
 
 model.compile(optimizer=Adam(learning_rate=0.001),
               loss='binary_crossentropy',
@@ -58,9 +82,9 @@ model.compile(optimizer=Adam(learning_rate=0.001),
 # --- 3. Training ---
 print("Starting Training...")
 model.fit(
-    train_generator,
+    train_ds,
     epochs=5,  # Quick train for MVP
-    validation_data=val_generator
+    validation_data=val_ds
 )
 
 # --- 4. Fine-Tuning (Critical for Accuracy) ---
@@ -75,12 +99,54 @@ model.compile(optimizer=Adam(learning_rate=1e-5),  # Low learning rate
               metrics=['accuracy'])
 
 model.fit(
-    train_generator,
+    train_ds,
     epochs=5,
-    validation_data=val_generator
+    validation_data=val_ds
 )
 
 # --- 5. Save Model ---
-# We save in .h5 format which handles custom architectures well
+# We save in .h5 format which handles custom architectures well.
+# Saved as a float32 copy: every consumer of the .h5 runs on CPU, where float16 layers are slow
+model = float32_copy(model)
 model.save('../models/pneumonia_model.h5')
-print("Model saved to ../models/pneumonia_model.h5")
\ No newline at end of file
+print("Model saved to ../models/pneumonia_model.h5")
+
+# --- 6. Quantization-Aware Training ---
+# A short QAT fine-tune lets the int8 TFLite export keep the float model's accuracy
+try:
+    import tensorflow_model_optimization as tfmot
+except ImportError:
+    tfmot = None
+
+if tfmot is None:
+    print("tensorflow-model-optimization not installed; skipping QAT export.")
+else:
+    print("Quantization-aware fine-tuning...")
+    # tfmot has no quantize config for Rescaling, so annotate every other layer.
+    # FakeQuant only accepts float32: annotate a float32 rebuild, never the mixed-precision graph
+    def annotate(layer):
+        if isinstance(layer, Rescaling):
+            return layer
+        return tfmot.quantization.keras.quantize_annotate_layer(layer)
+
+    annotated_model = float32_copy(model, wrap=annotate)
+    q_model = tfmot.quantization.keras.quantize_apply(annotated_model)
+    q_model.compile(optimizer=Adam(learning_rate=1e-5),
+                    loss='binary_crossentropy',
+                    metrics=['accuracy'])
+    q_model.fit(
+        train_ds,
+        epochs=2,
+        validation_data=val_ds
+    )
+
+    def representative_dataset():
+        for images, _ in val_ds.unbatch().batch(1).take(100):
+            yield [images]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(q_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    with open('../models/pneumonia_model_qat.tflite', 'wb') as f:
+        f.write(converter.convert())
+    print("QAT model saved to ../models/pneumonia_model_qat.tflite")
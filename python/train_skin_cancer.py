@@ -1,56 +1,75 @@
 import tensorflow as tf
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.applications import MobileNetV2
 from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout, Input
 from tensorflow.keras.models import Model
 from tensorflow.keras.optimizers import Adam
 import os
+from precision import float32_copy
+
+# Mixed precision: convs run in float16 on GPU tensor cores with float32 master weights.
+# Keras wraps the optimizer in a LossScaleOptimizer automatically at compile time.
+if tf.config.list_physical_devices('GPU'):
+    tf.keras.mixed_precision.set_global_policy('mixed_float16')
 
 # --- Configuration ---
 IMG_SIZE = (224, 224)
 BATCH_SIZE = 32
+# MobileNetV2 width multiplier: 0.75 cuts ~30% of the FLOPs of 1.0 at 224px (0.5 is worth benchmarking for this task).
+# The final conv stays 1280 channels for alpha <= 1, so the head and Grad-CAM layer are unchanged.
+ALPHA = 0.75
 EPOCHS = 20
 DATA_DIR = 'data/processed_skin_cancer'
 MODEL_SAVE_PATH = 'models/skin_cancer_model.h5'
+QAT_TFLITE_PATH = 'models/skin_cancer_qat.tflite'
 
 # --- 1. Data Augmentation & Loading ---
 # MobileNetV2 expects inputs in [-1, 1]. The 'preprocess_input' function handles this.
 from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
 
-train_datagen = ImageDataGenerator(
-    preprocessing_function=preprocess_input, # Auto-normalizes to [-1, 1]
-    rotation_range=20,
-    width_shift_range=0.2,
-    height_shift_range=0.2,
-    shear_range=0.2,
-    zoom_range=0.2,
-    horizontal_flip=True,
-    fill_mode='nearest'
-)
-
-val_datagen = ImageDataGenerator(preprocessing_function=preprocess_input)
+# JPEG decode, augmentation and batching run inside tf.data, in parallel with training
+AUTOTUNE = tf.data.AUTOTUNE
+augment = tf.keras.Sequential([
+    tf.keras.layers.RandomFlip('horizontal'),
+    tf.keras.layers.RandomRotation(20 / 360, fill_mode='nearest'),
+    tf.keras.layers.RandomTranslation(0.2, 0.2, fill_mode='nearest'),
+    tf.keras.layers.RandomZoom(0.2, fill_mode='nearest'),
+])
+
+def load_split(split, training=False):
+    ds = tf.keras.utils.image_dataset_from_directory(
+        os.path.join(DATA_DIR, split),
+        image_size=IMG_SIZE,
+        batch_size=None,
+        label_mode='categorical',  # 7 Classes
+        shuffle=False
+    )
+    class_names = ds.class_names
+    # Cache decoded images as uint8 so later epochs skip JPEG decode entirely
+    ds = ds.map(lambda x, y: (tf.cast(x, tf.uint8), y), num_parallel_calls=AUTOTUNE).cache()
+    if training:
+        # Files come back sorted by class, so shuffle across the whole split (a small window
+        # would yield single-class batches); the buffer holds the cached uint8 tensors
+        ds = ds.shuffle(ds.cardinality(), reshuffle_each_iteration=True)
+        # Let parallel map workers hand back batches out of order instead of stalling on the slowest
+        options = tf.data.Options()
+        options.deterministic = False
+        ds = ds.with_options(options)
+    ds = ds.batch(BATCH_SIZE).map(lambda x, y: (tf.cast(x, tf.float32), y), num_parallel_calls=AUTOTUNE)
+    if training:
+        ds = ds.map(lambda x, y: (augment(x, training=True), y), num_parallel_calls=AUTOTUNE)
+    ds = ds.map(lambda x, y: (preprocess_input(x), y), num_parallel_calls=AUTOTUNE)  # Auto-normalizes to [-1, 1]
+    return ds.prefetch(AUTOTUNE), class_names
 
 print("Loading Data...")
-train_generator = train_datagen.flow_from_directory(
-    os.path.join(DATA_DIR, 'train'),
-    target_size=IMG_SIZE,
-    batch_size=BATCH_SIZE,
-    class_mode='categorical' # 7 Classes
-)
-
-val_generator = val_datagen.flow_from_directory(
-    os.path.join(DATA_DIR, 'val'),
-    target_size=IMG_SIZE,
-    batch_size=BATCH_SIZE,
-    class_mode='categorical'
-)
+train_ds, class_names = load_split('train', training=True)
+val_ds, _ = load_split('val')
 
 # Print class indices for Flutter mapping
-print("✅ Class Mappings (Use these in Flutter):", train_generator.class_indices)
+print("✅ Class Mappings (Use these in Flutter):", {name: i for i, name in enumerate(class_names)})
 
 # --- 2. Model Architecture ---
 # Base: MobileNetV2 (Pre-trained on ImageNet)
-base_model = MobileNetV2(weights='imagenet', include_top=False, input_shape=(224, 224, 3))
+base_model = MobileNetV2(weights='imagenet', include_top=False, input_shape=(224, 224, 3), alpha=ALPHA)
 
 # Explainability Hook: We name the last conv layer to find it easily later if needed
 last_conv_layer = base_model.get_layer('out_relu') 
@@ -60,7 +79,7 @@ x = GlobalAveragePooling2D()(x)
 x = Dense(128, activation='relu')(x)
 x = Dropout(0.4)(x)
 # 7 Output classes
-predictions = Dense(7, activation='softmax')(x)
+predictions = Dense(7, activation='softmax', dtype='float32')(x)  # Keep the output/loss in float32
 
 model = Model(inputs=base_model.input, outputs=predictions)
 
@@ -74,9 +93,9 @@ model.compile(optimizer=Adam(learning_rate=0.001),
 # --- 3. Initial Training ---
 print("🚀 Starting Transfer Learning...")
 model.fit(
-    train_generator,
+    train_ds,
     epochs=5,
-    validation_data=val_generator
+    validation_data=val_ds
 )
 
 # --- 4. Fine-Tuning ---
@@ -91,11 +110,47 @@ model.compile(optimizer=Adam(learning_rate=1e-5), # Lower learning rate
               metrics=['accuracy'])
 
 model.fit(
-    train_generator,
+    train_ds,
     epochs=15,
-    validation_data=val_generator
+    validation_data=val_ds
 )
 
 # --- 5. Save Model ---
+# Saved as a float32 copy: convert_skin_tflite.py and the API run it on CPU
+model = float32_copy(model)
 model.save(MODEL_SAVE_PATH)
-print(f"✅ Model saved to {MODEL_SAVE_PATH}")
\ No newline at end of file
+print(f"✅ Model saved to {MODEL_SAVE_PATH}")
+
+# --- 6. Quantization-Aware Training ---
+# A short QAT fine-tune lets the int8 TFLite export keep the float model's accuracy
+try:
+    import tensorflow_model_optimization as tfmot
+except ImportError:
+    tfmot = None
+
+if tfmot is None:
+    print("⚠️ tensorflow-model-optimization not installed; skipping QAT export.")
+else:
+    print("🔧 Quantization-aware fine-tuning...")
+    # FakeQuant only accepts float32: quantize a float32 rebuild, never the mixed-precision graph
+    annotated_model = float32_copy(model, wrap=tfmot.quantization.keras.quantize_annotate_layer)
+    q_model = tfmot.quantization.keras.quantize_apply(annotated_model)
+    q_model.compile(optimizer=Adam(learning_rate=1e-5),
+                    loss='categorical_crossentropy',
+                    metrics=['accuracy'])
+    q_model.fit(
+        train_ds,
+        epochs=2,
+        validation_data=val_ds
+    )
+
+    def representative_dataset():
+        for images, _ in val_ds.unbatch().batch(1).take(100):
+            yield [images]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(q_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    with open(QAT_TFLITE_PATH, 'wb') as f:
+        f.write(converter.convert())
+    print(f"✅ QAT model saved to {QAT_TFLITE_PATH}")
@@ -3,21 +3,40 @@ import numpy as np
 import tensorflow as tf
 import json
 import os
+import shutil
 from sklearn.model_selection import train_test_split, StratifiedKFold
-from sklearn.preprocessing import StandardScaler, RobustScaler
+from sklearn.preprocessing import RobustScaler
 from sklearn.utils.class_weight import compute_class_weight
-from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score, roc_curve
+from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score, roc_curve, auc as area_under_curve
+from sklearn.neighbors import NearestNeighbors
 from imblearn.over_sampling import SMOTE
-from imblearn.combine import SMOTETomek
+import matplotlib
+matplotlib.use('Agg')  # Headless: render straight to PNG buffers, no GUI event loop
 import matplotlib.pyplot as plt
 import seaborn as sns
 import joblib
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+except ImportError:
+    pa = None
 from datetime import datetime
 
 # Set random seeds for reproducibility
 np.random.seed(42)
 tf.random.set_seed(42)
 
+# Mixed precision on GPU only (float16 is slower than float32 on CPU); the output layer stays float32
+if tf.config.list_physical_devices('GPU'):
+    tf.keras.mixed_precision.set_global_policy('mixed_float16')
+
+# 120 dpi is plenty for report figures; 300 dpi rasterizes ~6x the pixels per savefig
+PLOT_DPI = 120
+
+# On-disk memoization of the deterministic preprocessing steps; joblib hashes the
+# arguments, so an edited stroke.csv (or changed parameters) misses the cache
+memory = joblib.Memory('.cache', verbose=0)
+
 # Create directories
 os.makedirs('assets', exist_ok=True)
 os.makedirs('models', exist_ok=True)
@@ -34,34 +53,38 @@ def analyze_dataset(df, required_features, target_col):
     print(f"\n📁 Dataset Shape: {df.shape}")
     print(f"   Rows: {df.shape[0]:,} | Columns: {df.shape[1]}")
     
-    # Missing values
+    # One float view of the feature columns, reused by every check below
+    values = df[required_features].to_numpy(dtype=float)
+    
+    # Missing values (the target is parsed as int8, so it can't hold NaN)
     print("\n🔍 Missing Values:")
-    missing = df[required_features + [target_col]].isnull().sum()
-    for col, count in missing.items():
+    missing = np.isnan(values).sum(axis=0)
+    for col, count in zip(required_features, missing):
         if count > 0:
             pct = (count / len(df)) * 100
             print(f"   {col}: {count:,} ({pct:.2f}%)")
     
     # Target distribution
     print(f"\n🎯 Target Distribution ({target_col}):")
-    target_counts = df[target_col].value_counts()
-    for val, count in target_counts.items():
+    target_counts = np.bincount(df[target_col].to_numpy(), minlength=2)
+    for val, count in enumerate(target_counts):
         pct = (count / len(df)) * 100
         label = "Stroke" if val == 1 else "No Stroke"
         print(f"   {label} ({val}): {count:,} ({pct:.2f}%)")
     
     # Feature statistics
     print("\n📈 Feature Statistics:")
-    stats = df[required_features].describe()
+    stats = df[required_features].describe(percentiles=[.25, .5, .75])
     print(stats)
     
     # Check for outliers using IQR method
     print("\n⚠️  Outlier Detection (IQR Method):")
-    for col in required_features:
-        Q1 = df[col].quantile(0.25)
-        Q3 = df[col].quantile(0.75)
-        IQR = Q3 - Q1
-        outliers = ((df[col] < (Q1 - 1.5 * IQR)) | (df[col] > (Q3 + 1.5 * IQR))).sum()
+    # Quartiles come from describe() above (same NaN-skipping linear interpolation)
+    Q1 = stats.loc['25%'].to_numpy()
+    Q3 = stats.loc['75%'].to_numpy()
+    IQR = Q3 - Q1
+    outlier_counts = ((values < (Q1 - 1.5 * IQR)) | (values > (Q3 + 1.5 * IQR))).sum(axis=0)
+    for col, outliers in zip(required_features, outlier_counts):
         if outliers > 0:
             pct = (outliers / len(df)) * 100
             print(f"   {col}: {outliers:,} outliers ({pct:.2f}%)")
@@ -89,7 +112,7 @@ def create_visualizations(df, required_features, target_col):
     # Remove empty subplot
     fig.delaxes(axes[1, 2])
     plt.tight_layout()
-    plt.savefig('plots/feature_distributions.png', dpi=300, bbox_inches='tight')
+    plt.savefig('plots/feature_distributions.png', dpi=PLOT_DPI, bbox_inches='tight')
     print("✅ Saved: plots/feature_distributions.png")
     plt.close()
     
@@ -100,7 +123,7 @@ def create_visualizations(df, required_features, target_col):
                 center=0, square=True, linewidths=1)
     plt.title('Feature Correlation Matrix', fontsize=16, fontweight='bold')
     plt.tight_layout()
-    plt.savefig('plots/correlation_matrix.png', dpi=300, bbox_inches='tight')
+    plt.savefig('plots/correlation_matrix.png', dpi=PLOT_DPI, bbox_inches='tight')
     print("✅ Saved: plots/correlation_matrix.png")
     plt.close()
     
@@ -108,12 +131,16 @@ def create_visualizations(df, required_features, target_col):
     fig, axes = plt.subplots(2, 3, figsize=(15, 10))
     fig.suptitle('Feature Distributions by Stroke Status', fontsize=16, fontweight='bold')
     
+    is_stroke = (df[target_col] == 1).to_numpy()
     for idx, feature in enumerate(required_features):
         ax = axes[idx // 3, idx % 3]
-        df[df[target_col] == 0][feature].hist(ax=ax, bins=20, alpha=0.6, 
-                                               label='No Stroke', color='green')
-        df[df[target_col] == 1][feature].hist(ax=ax, bins=20, alpha=0.6, 
-                                               label='Stroke', color='red')
+        # Bin each class once in C and draw the bars directly
+        values = df[feature].to_numpy(dtype=float)
+        present = ~np.isnan(values)
+        for stroke, label, color in [(False, 'No Stroke', 'green'), (True, 'Stroke', 'red')]:
+            counts, edges = np.histogram(values[present & (is_stroke == stroke)], bins=20)
+            ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge',
+                   alpha=0.6, label=label, color=color)
         ax.set_title(feature.replace('_', ' ').title())
         ax.set_xlabel('Value')
         ax.set_ylabel('Frequency')
@@ -122,59 +149,63 @@ def create_visualizations(df, required_features, target_col):
     
     fig.delaxes(axes[1, 2])
     plt.tight_layout()
-    plt.savefig('plots/feature_by_target.png', dpi=300, bbox_inches='tight')
+    plt.savefig('plots/feature_by_target.png', dpi=PLOT_DPI, bbox_inches='tight')
     print("✅ Saved: plots/feature_by_target.png")
     plt.close()
 
+@memory.cache
 def clean_data(df, required_features, target_col):
-    """Clean and preprocess the dataset"""
+    """Clean and preprocess the dataset; returns (X, y) as float32 / int8 arrays"""
     print("\n" + "="*60)
     print("🧹 DATA CLEANING")
     print("="*60)
     
     initial_rows = len(df)
     
-    # Filter to required columns
-    df = df[required_features + [target_col]].copy()
+    # Filter to required columns, as float32 arrays (half the bandwidth of float64 downstream)
+    X = df[required_features].to_numpy(dtype=np.float32, copy=True)
+    y = df[target_col].to_numpy(dtype=np.float32)
     
     # Handle missing BMI values
-    if df['bmi'].isnull().sum() > 0:
-        missing_count = df['bmi'].isnull().sum()
-        median_bmi = df['bmi'].median()
-        df['bmi'].fillna(median_bmi, inplace=True)
+    bmi = X[:, required_features.index('bmi')]
+    missing = np.isnan(bmi)
+    if missing.any():
+        missing_count = missing.sum()
+        median_bmi = np.nanmedian(bmi)
+        bmi[missing] = median_bmi
         print(f"✅ Filled {missing_count} missing BMI values with median: {median_bmi:.2f}")
     
     # Drop remaining NaN values
-    df_clean = df.dropna()
-    dropped = initial_rows - len(df_clean)
+    valid = ~(np.isnan(X).any(axis=1) | np.isnan(y))
+    dropped = (~valid).sum()
     if dropped > 0:
         print(f"⚠️  Dropped {dropped} rows with missing values")
     
-    # Remove extreme outliers - more lenient bounds
-    outliers_removed = 0
-    
-    # Age should be reasonable (0-120)
-    mask = (df_clean['age'] >= 0) & (df_clean['age'] <= 120)
-    outliers_removed += (~mask).sum()
-    df_clean = df_clean[mask]
-    
-    # BMI should be reasonable (12-60) - adjusted range
-    mask = (df_clean['bmi'] >= 12) & (df_clean['bmi'] <= 60)
-    outliers_removed += (~mask).sum()
-    df_clean = df_clean[mask]
-    
-    # Glucose should be reasonable (50-400) - adjusted range
-    mask = (df_clean['avg_glucose_level'] >= 50) & (df_clean['avg_glucose_level'] <= 400)
-    outliers_removed += (~mask).sum()
-    df_clean = df_clean[mask]
+    # Remove extreme outliers - more lenient bounds, checked in one fused mask:
+    # Age should be reasonable (0-120), BMI (12-60), Glucose (50-400) - adjusted ranges
+    bounds = {'age': (0, 120), 'bmi': (12, 60), 'avg_glucose_level': (50, 400)}
+    lo, hi = np.array(list(bounds.values())).T
+    values = X[:, [required_features.index(col) for col in bounds]]
+    keep = ((values >= lo) & (values <= hi)).all(axis=1)
+    outliers_removed = (valid & ~keep).sum()
+    keep &= valid
+    X, y = X[keep], y[keep].astype(np.int8)
     
     if outliers_removed > 0:
         print(f"⚠️  Removed {outliers_removed} extreme outliers")
     
-    print(f"\n✅ Final Dataset: {len(df_clean):,} rows")
-    print(f"   Data retained: {(len(df_clean)/initial_rows)*100:.2f}%")
+    print(f"\n✅ Final Dataset: {len(X):,} rows")
+    print(f"   Data retained: {(len(X)/initial_rows)*100:.2f}%")
     
-    return df_clean
+    return X, y
+
+@memory.cache(ignore=['n_jobs'])
+def resample_smote(X, y, seed=42, n_jobs=-1):
+    """Oversample the minority class with SMOTE"""
+    # Plain SMOTE (no Tomek-link cleanup pass): oversampling alone keeps all majority rows,
+    # and the 5-NN search runs on a kd-tree across n_jobs cores (n_neighbors includes the point itself)
+    smote = SMOTE(random_state=seed, k_neighbors=NearestNeighbors(n_neighbors=6, algorithm='kd_tree', n_jobs=n_jobs))
+    return smote.fit_resample(X, y)
 
 def engineer_features(X, feature_names):
     """Create additional engineered features"""
@@ -182,36 +213,59 @@ def engineer_features(X, feature_names):
     print("🔧 FEATURE ENGINEERING")
     print("="*60)
     
-    X_df = pd.DataFrame(X, columns=feature_names)
+    # Written column by column into one preallocated float32 matrix (no DataFrame, no temporaries)
+    engineered = ['age_glucose', 'bmi_glucose', 'age_bmi', 'health_risk', 'age_squared',
+                  'bmi_squared', 'age_group_risk', 'glucose_risk', 'bmi_category']
+    new_features = list(feature_names) + engineered
+    out = np.empty((len(X), len(new_features)), dtype=np.float32)
+    out[:, :len(feature_names)] = X
+    col = {name: out[:, i] for i, name in enumerate(new_features)}
+    age, hypertension, heart_disease, glucose, bmi = (
+        col[f] for f in ['age', 'hypertension', 'heart_disease', 'avg_glucose_level', 'bmi']
+    )
     
     # Create interaction features
-    X_df['age_glucose'] = X_df['age'] * X_df['avg_glucose_level'] / 100
-    X_df['bmi_glucose'] = X_df['bmi'] * X_df['avg_glucose_level'] / 100
-    X_df['age_bmi'] = X_df['age'] * X_df['bmi'] / 100
+    np.multiply(age, glucose / 100, out=col['age_glucose'])
+    np.multiply(bmi, glucose / 100, out=col['bmi_glucose'])
+    np.multiply(age, bmi / 100, out=col['age_bmi'])
     
     # Risk indicators
-    X_df['health_risk'] = X_df['hypertension'] + X_df['heart_disease']
-    X_df['age_squared'] = X_df['age'] ** 2
-    X_df['bmi_squared'] = X_df['bmi'] ** 2
+    np.add(hypertension, heart_disease, out=col['health_risk'])
+    np.square(age, out=col['age_squared'])
+    np.square(bmi, out=col['bmi_squared'])
     
-    # Age groups (polynomial features)
-    X_df['age_group_risk'] = np.where(X_df['age'] > 60, 2, 
-                              np.where(X_df['age'] > 40, 1, 0))
+    # Age groups (polynomial features): >40 -> 1, >60 -> 2
+    col['age_group_risk'][:] = np.digitize(age, [40, 60], right=True)
     
-    # Glucose risk levels
-    X_df['glucose_risk'] = np.where(X_df['avg_glucose_level'] > 200, 2,
-                            np.where(X_df['avg_glucose_level'] > 140, 1, 0))
+    # Glucose risk levels: >140 -> 1, >200 -> 2
+    col['glucose_risk'][:] = np.digitize(glucose, [140, 200], right=True)
     
-    # BMI categories
-    X_df['bmi_category'] = np.where(X_df['bmi'] > 30, 2,
-                            np.where(X_df['bmi'] > 25, 1, 0))
+    # BMI categories: >25 -> 1, >30 -> 2
+    col['bmi_category'][:] = np.digitize(bmi, [25, 30], right=True)
     
-    new_features = list(X_df.columns)
     print(f"✅ Created {len(new_features) - len(feature_names)} new features")
     print(f"   Total features: {len(new_features)}")
     print(f"   New features: {[f for f in new_features if f not in feature_names]}")
     
-    return X_df.values, new_features
+    return out, new_features
+
+class Standardizer:
+    """In-place float32 z-scoring with the same mean_/scale_ attributes as StandardScaler"""
+    
+    def fit_transform(self, X):
+        """Fit on X and standardize it in place; accumulates in float64 like sklearn"""
+        X = np.asarray(X, dtype=np.float32)
+        self.mean_ = X.mean(axis=0, dtype=np.float64)
+        self.scale_ = X.std(axis=0, dtype=np.float64)
+        self.scale_[self.scale_ == 0] = 1.0  # constant columns pass through, as in StandardScaler
+        return self.transform(X)
+    
+    def transform(self, X):
+        """Standardize X in place (float32 arrays are not copied)"""
+        X = np.asarray(X, dtype=np.float32)
+        np.subtract(X, self.mean_.astype(np.float32), out=X)
+        np.divide(X, self.scale_.astype(np.float32), out=X)
+        return X
 
 def build_improved_model(input_shape, learning_rate=0.0005):
     """Build an improved neural network with better architecture"""
@@ -247,7 +301,7 @@ def build_improved_model(input_shape, learning_rate=0.0005):
         tf.keras.layers.Activation('relu'),
         
         # Output layer
-        tf.keras.layers.Dense(1, activation='sigmoid')
+        tf.keras.layers.Dense(1, activation='sigmoid', dtype='float32')
     ])
     
     # Use Adam with custom learning rate
@@ -266,7 +320,10 @@ def build_improved_model(input_shape, learning_rate=0.0005):
             tf.keras.metrics.AUC(name='auc'),
             tf.keras.metrics.Precision(name='precision'),
             tf.keras.metrics.Recall(name='recall')
-        ]
+        ],
+        # XLA-compile train/test/predict steps: fuses each Dense+BN+ReLU+Dropout block
+        # instead of launching every small op separately
+        jit_compile=True
     )
     
     return model
@@ -314,11 +371,11 @@ def plot_training_history(history):
     axes[1, 1].grid(True, alpha=0.3)
     
     plt.tight_layout()
-    plt.savefig('plots/training_history.png', dpi=300, bbox_inches='tight')
+    plt.savefig('plots/training_history.png', dpi=PLOT_DPI, bbox_inches='tight')
     print("✅ Saved: plots/training_history.png")
     plt.close()
 
-def evaluate_model(model, X_test, y_test, feature_names):
+def evaluate_model(model, X_test, y_test, feature_names, plots=True):
     """Comprehensive model evaluation"""
     print("\n" + "="*60)
     print("📊 MODEL EVALUATION")
@@ -354,6 +411,17 @@ def evaluate_model(model, X_test, y_test, feature_names):
                                 target_names=['No Stroke', 'Stroke'],
                                 digits=4))
     
+    results = {
+        'accuracy': accuracy,
+        'auc': auc,
+        'loss': loss,
+        'optimal_threshold': optimal_threshold,
+        'y_pred': y_pred,
+        'y_pred_proba': y_pred_proba
+    }
+    if not plots:
+        return results
+    
     # Confusion Matrix
     cm = confusion_matrix(y_test, y_pred)
     plt.figure(figsize=(8, 6))
@@ -365,7 +433,7 @@ def evaluate_model(model, X_test, y_test, feature_names):
     plt.ylabel('True Label')
     plt.xlabel('Predicted Label')
     plt.tight_layout()
-    plt.savefig('plots/confusion_matrix.png', dpi=300, bbox_inches='tight')
+    plt.savefig('plots/confusion_matrix.png', dpi=PLOT_DPI, bbox_inches='tight')
     print("✅ Saved: plots/confusion_matrix.png")
     plt.close()
     
@@ -383,23 +451,25 @@ def evaluate_model(model, X_test, y_test, feature_names):
     plt.legend(loc="lower right", fontsize=12)
     plt.grid(True, alpha=0.3)
     plt.tight_layout()
-    plt.savefig('plots/roc_curve.png', dpi=300, bbox_inches='tight')
+    plt.savefig('plots/roc_curve.png', dpi=PLOT_DPI, bbox_inches='tight')
     print("✅ Saved: plots/roc_curve.png")
     plt.close()
     
     # Feature importance (using permutation - approximation)
     if len(feature_names) <= 15:  # Only for reasonable number of features
         print("\n🔍 Computing Feature Importance...")
-        baseline_auc = roc_auc_score(y_test, y_pred_proba)
-        importances = []
-        
-        for i, feature in enumerate(feature_names):
-            X_permuted = X_test.copy()
-            np.random.shuffle(X_permuted[:, i])
-            y_pred_permuted = model.predict(X_permuted, verbose=0).flatten()
-            permuted_auc = roc_auc_score(y_test, y_pred_permuted)
-            importance = baseline_auc - permuted_auc
-            importances.append(importance)
+        # Same value as roc_auc_score(y_test, y_pred_proba), read off the ROC curve computed above
+        baseline_auc = area_under_curve(fpr, tpr)
+
+        # One stacked copy of the test set per feature, block k with column k shuffled,
+        # scored in a single predict call instead of one call per feature
+        n_features, n = len(feature_names), len(X_test)
+        rng = np.random.default_rng(42)
+        X_permuted = np.tile(X_test, (n_features, 1))
+        for k in range(n_features):
+            rng.shuffle(X_permuted[k*n:(k+1)*n, k])
+        y_pred_permuted = model.predict(X_permuted, batch_size=8192, verbose=0).reshape(n_features, n)
+        importances = [baseline_auc - roc_auc_score(y_test, y_pred_permuted[k]) for k in range(n_features)]
         
         # Plot feature importance
         feature_importance_df = pd.DataFrame({
@@ -414,18 +484,74 @@ def evaluate_model(model, X_test, y_test, feature_names):
         plt.title('Feature Importance', fontsize=16, fontweight='bold')
         plt.grid(True, alpha=0.3, axis='x')
         plt.tight_layout()
-        plt.savefig('plots/feature_importance.png', dpi=300, bbox_inches='tight')
+        plt.savefig('plots/feature_importance.png', dpi=PLOT_DPI, bbox_inches='tight')
         print("✅ Saved: plots/feature_importance.png")
         plt.close()
     
-    return {
-        'accuracy': accuracy,
-        'auc': auc,
-        'loss': loss,
-        'optimal_threshold': optimal_threshold,
-        'y_pred': y_pred,
-        'y_pred_proba': y_pred_proba
-    }
+    return results
+
+def _train_one_fold(X_tr, y_tr, X_va, y_va, use_smote, intra_op_threads):
+    """Fit a fresh model on one CV fold (runs in a loky worker); returns the fold's validation AUC"""
+    # One inter-op thread and a share of the cores per worker, so parallel folds don't oversubscribe
+    try:
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    except RuntimeError:
+        pass  # reused worker whose TF runtime is already initialized
+    
+    if use_smote:
+        # Same per-worker thread budget for the SMOTE neighbour search
+        X_tr, y_tr = resample_smote(X_tr, y_tr, n_jobs=intra_op_threads)
+    class_weight = None if use_smote else dict(enumerate(
+        compute_class_weight(class_weight='balanced', classes=np.unique(y_tr), y=y_tr)
+    ))
+    
+    scaler = Standardizer()
+    X_tr = scaler.fit_transform(X_tr)
+    X_va = scaler.transform(X_va)
+    
+    model = build_improved_model(input_shape=X_tr.shape[1])
+    model.fit(
+        X_tr, y_tr.astype(np.float32),
+        epochs=200,
+        batch_size=512,
+        validation_data=(X_va, y_va.astype(np.float32)),
+        class_weight=class_weight,
+        callbacks=[tf.keras.callbacks.EarlyStopping(
+            monitor='val_auc', patience=20, restore_best_weights=True, mode='max'
+        )],
+        verbose=0
+    )
+    return roc_auc_score(y_va, model.predict(X_va, batch_size=8192, verbose=0).ravel())
+
+def cross_validate_model(X, y, use_smote=True, n_splits=5):
+    """Stratified K-fold AUC, one fold per process on CPU hosts, sequential on GPU"""
+    print("\n" + "="*60)
+    print(f"🔁 {n_splits}-FOLD CROSS-VALIDATION")
+    print("="*60)
+    
+    folds = list(StratifiedKFold(n_splits, shuffle=True, random_state=42).split(X, y))
+    if tf.config.list_physical_devices('GPU'):
+        # Each worker would initialize TF on the GPU and pre-allocate most of its memory,
+        # so folds 2..N would hit CUDA OOM; run them one after another in this process instead
+        n_jobs = 1
+        print(f"⚙️  GPU present: training {n_splits} folds sequentially...")
+    else:
+        n_jobs = min(n_splits, os.cpu_count() or 1)
+        print(f"⚙️  Training {n_splits} folds across {n_jobs} processes...")
+    intra_op_threads = max(1, (os.cpu_count() or 1) // n_jobs)
+    
+    # SMOTE and scaling are fitted inside each fold, on its training part only
+    aucs = joblib.Parallel(n_jobs=n_jobs, backend='loky')(
+        joblib.delayed(_train_one_fold)(X[tr], y[tr], X[va], y[va], use_smote, intra_op_threads)
+        for tr, va in folds
+    )
+    
+    for k, fold_auc in enumerate(aucs, 1):
+        print(f"   Fold {k}: AUC = {fold_auc:.4f}")
+    print(f"✅ CV AUC: {np.mean(aucs):.4f} ± {np.std(aucs):.4f}")
+    
+    return aucs
 
 def save_model_artifacts(model, scaler, original_features, all_features, metrics):
     """Save all model artifacts"""
@@ -494,7 +620,7 @@ def save_model_artifacts(model, scaler, original_features, all_features, metrics
         json.dump(metadata, f, indent=2)
     print("✅ Saved: models/model_metadata.json")
 
-def train_stroke_model(use_smote=True, use_feature_engineering=True):
+def train_stroke_model(use_smote=True, use_feature_engineering=True, plots=True, cv_folds=0):
     """Main training pipeline with improvements"""
     print("\n" + "="*70)
     print("🚑 STROKE RISK PREDICTION MODEL TRAINING (ENHANCED)")
@@ -502,6 +628,8 @@ def train_stroke_model(use_smote=True, use_feature_engineering=True):
     print(f"📅 Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"🔧 SMOTE: {'Enabled' if use_smote else 'Disabled'}")
     print(f"🔧 Feature Engineering: {'Enabled' if use_feature_engineering else 'Disabled'}")
+    print(f"🔧 Plots: {'Enabled' if plots else 'Disabled'}")
+    print(f"🔧 Cross-Validation: {f'{cv_folds} folds' if cv_folds else 'Disabled'}")
     
     # Configuration
     csv_file = 'stroke.csv'
@@ -518,7 +646,20 @@ def train_stroke_model(use_smote=True, use_feature_engineering=True):
         print(f"   Please download from: https://www.kaggle.com/datasets/fedesoriano/stroke-prediction-dataset")
         return
     
-    df = pd.read_csv(csv_file)
+    # Parse only the columns we use, straight into compact dtypes (no object/float64 detour)
+    usecols = required_features + [target_col]
+    dtypes = {'age': 'float32', 'hypertension': 'int8', 'heart_disease': 'int8',
+              'avg_glucose_level': 'float32', 'bmi': 'float32', target_col: 'int8'}
+    if pa is not None:
+        # Multithreaded Arrow parser with an explicit schema: no type inference and no
+        # astype afterwards (pandas' pyarrow engine infers first, then casts to dtype)
+        table = pa_csv.read_csv(csv_file, convert_options=pa_csv.ConvertOptions(
+            column_types={col: pa.type_for_alias(dtype) for col, dtype in dtypes.items()},
+            include_columns=usecols
+        ))
+        df = table.to_pandas()
+    else:
+        df = pd.read_csv(csv_file, engine='c', usecols=usecols, dtype=dtypes)
     print(f"✅ Loaded: {csv_file}")
     print(f"   Shape: {df.shape}")
     
@@ -526,16 +667,22 @@ def train_stroke_model(use_smote=True, use_feature_engineering=True):
     df = analyze_dataset(df, required_features, target_col)
     
     # 3. Create Visualizations
-    create_visualizations(df, required_features, target_col)
+    if plots:
+        create_visualizations(df, required_features, target_col)
     
     # 4. Clean Data
-    df_clean = clean_data(df, required_features, target_col)
+    # 5. Prepare Features and Target (float32 features, int8 target)
+    X, y = clean_data(df, required_features, target_col)
     
-    # 5. Prepare Features and Target
-    X = df_clean[required_features].values
-    y = df_clean[target_col].values
+    # 6. Feature Engineering (before scaling)
+    # Row-wise and stateless (nothing is fitted), so it runs once on the full matrix before the split
+    original_features = required_features.copy()
+    if use_feature_engineering:
+        X, all_features = engineer_features(X, required_features)
+    else:
+        all_features = required_features
     
-    # 6. Train-Test Split (before SMOTE to avoid data leakage)
+    # 7. Train-Test Split (before SMOTE to avoid data leakage)
     print("\n" + "="*60)
     print("🔀 SPLITTING DATA")
     print("="*60)
@@ -549,13 +696,9 @@ def train_stroke_model(use_smote=True, use_feature_engineering=True):
     print(f"   Train stroke rate: {(y_train.sum()/len(y_train))*100:.2f}%")
     print(f"   Test stroke rate: {(y_test.sum()/len(y_test))*100:.2f}%")
     
-    # 7. Feature Engineering (before scaling)
-    original_features = required_features.copy()
-    if use_feature_engineering:
-        X_train, all_features = engineer_features(X_train, required_features)
-        X_test, _ = engineer_features(X_test, required_features)
-    else:
-        all_features = required_features
+    # Optional: K-fold estimate on the training split (the test set stays held out)
+    if cv_folds:
+        cross_validate_model(X_train, y_train, use_smote=use_smote, n_splits=cv_folds)
     
     # 8. Apply SMOTE (before scaling for better results)
     if use_smote:
@@ -567,9 +710,7 @@ def train_stroke_model(use_smote=True, use_feature_engineering=True):
         print(f"   - Class 0: {(y_train == 0).sum():,}")
         print(f"   - Class 1: {(y_train == 1).sum():,}")
         
-        # Use SMOTETomek for better balance
-        smote_tomek = SMOTETomek(random_state=42)
-        X_train, y_train = smote_tomek.fit_resample(X_train, y_train)
+        X_train, y_train = resample_smote(X_train, y_train)
         
         print(f"   After SMOTE:")
         print(f"   - Class 0: {(y_train == 0).sum():,}")
@@ -581,10 +722,10 @@ def train_stroke_model(use_smote=True, use_feature_engineering=True):
     print("⚖️  FEATURE SCALING")
     print("="*60)
     
-    scaler = StandardScaler()
+    scaler = Standardizer()
     X_train_scaled = scaler.fit_transform(X_train)
     X_test_scaled = scaler.transform(X_test)
-    print("✅ Features standardized using StandardScaler")
+    print("✅ Features standardized (z-score, StandardScaler-compatible)")
     
     # 10. Class Weights (still useful even with SMOTE)
     print("\n" + "="*60)
@@ -617,7 +758,53 @@ def train_stroke_model(use_smote=True, use_feature_engineering=True):
     print("🏋️  TRAINING MODEL")
     print("="*60)
     
+    # Explicit stratified validation split (validation_split would take the last 20% of the
+    # resampled rows), fed through tf.data so batches are prefetched while the model trains
+    X_fit, X_val, y_fit, y_val = train_test_split(
+        X_train_scaled, y_train.astype(np.float32),
+        test_size=0.2, random_state=42, stratify=y_train
+    )
+    
+    # Crash-recovery state lives in a directory keyed by the run config and data, so a backup
+    # left by a crashed run is only resumed by the same run; other configs' leftovers are cleared
+    backup_root = 'models/train_backup'
+    run_key = joblib.hash((X_fit, y_fit, use_smote, all_features, cv_folds))
+    run_dir = os.path.join(backup_root, run_key)
+    if os.path.isdir(backup_root):
+        for name in os.listdir(backup_root):
+            if name != run_key:
+                shutil.rmtree(os.path.join(backup_root, name), ignore_errors=True)
+    os.makedirs(run_dir, exist_ok=True)
+    
+    # The best checkpoint and its val_auc sit next to the backup: on resume, ModelCheckpoint
+    # starts from the pre-crash best instead of overwriting it with a worse epoch
+    run_best_weights = os.path.join(run_dir, 'best.weights.h5')
+    run_best_score = os.path.join(run_dir, 'best_val_auc.json')
+    initial_best = None
+    if os.path.exists(run_best_score) and os.path.exists(run_best_weights):
+        with open(run_best_score) as f:
+            initial_best = json.load(f)['val_auc']
+        print(f"♻️  Resuming interrupted run (best val_auc so far: {initial_best:.4f})")
+    
+    # Weights only: no graph/config reserialization on every val_auc improvement
+    checkpoint = tf.keras.callbacks.ModelCheckpoint(
+        run_best_weights,
+        monitor='val_auc',
+        save_best_only=True,
+        save_weights_only=True,
+        mode='max',
+        initial_value_threshold=initial_best,
+        verbose=0
+    )
+    
+    def save_best_score(epoch, logs):
+        if checkpoint.best not in (None, -np.inf):
+            with open(run_best_score, 'w') as f:
+                json.dump({'val_auc': float(checkpoint.best)}, f)
+    
     callbacks = [
+        # Resume from the last finished epoch if a run is interrupted; removed once fit() completes
+        tf.keras.callbacks.BackupAndRestore(backup_dir=os.path.join(run_dir, 'state')),
         tf.keras.callbacks.EarlyStopping(
             monitor='val_auc',
             patience=20,
@@ -632,32 +819,42 @@ def train_stroke_model(use_smote=True, use_feature_engineering=True):
             min_lr=1e-7,
             verbose=1
         ),
-        tf.keras.callbacks.ModelCheckpoint(
-            'models/best_model.keras',
-            monitor='val_auc',
-            save_best_only=True,
-            mode='max',
-            verbose=0
-        )
+        checkpoint,
+        tf.keras.callbacks.LambdaCallback(on_epoch_end=save_best_score)
     ]
     
+    batch_size = 512
+    train_ds = (tf.data.Dataset.from_tensor_slices((X_fit, y_fit))
+                .shuffle(8192, seed=42)
+                .batch(batch_size)
+                .prefetch(tf.data.AUTOTUNE))
+    val_ds = tf.data.Dataset.from_tensor_slices((X_val, y_val)).batch(batch_size).prefetch(tf.data.AUTOTUNE)
+    
     history = model.fit(
-        X_train_scaled, y_train,
+        train_ds,
         epochs=200,
-        batch_size=64,
-        validation_split=0.2,
+        validation_data=val_ds,
         class_weight=class_weights if not use_smote else None,
         callbacks=callbacks,
         verbose=1
     )
     
+    # Best val_auc epoch (across a resume too), also when training ran all epochs without
+    # early stopping; the finished run's recovery directory is no longer needed
+    best_weights_path = 'models/best_model.weights.h5'
+    if os.path.exists(run_best_weights):
+        model.load_weights(run_best_weights)
+        shutil.copyfile(run_best_weights, best_weights_path)
+    shutil.rmtree(run_dir, ignore_errors=True)
+    
     print("\n✅ Training completed!")
     
     # 13. Plot Training History
-    plot_training_history(history)
+    if plots:
+        plot_training_history(history)
     
     # 14. Evaluate Model
-    metrics = evaluate_model(model, X_test_scaled, y_test, all_features)
+    metrics = evaluate_model(model, X_test_scaled, y_test, all_features, plots=plots)
     
     # 15. Save Everything
     save_model_artifacts(model, scaler, original_features, all_features, metrics)
@@ -673,19 +870,33 @@ def train_stroke_model(use_smote=True, use_feature_engineering=True):
     print(f"   Optimal Threshold: {metrics['optimal_threshold']:.4f}")
     print(f"\n📁 Generated Files:")
     print(f"   ├── models/stroke_model.keras")
-    print(f"   ├── models/best_model.keras")
+    print(f"   ├── models/best_model.weights.h5")
     print(f"   ├── models/model_metadata.json")
     print(f"   ├── models/scaler_complete.json")
-    print(f"   ├── assets/stroke_scaler.json (for Flutter)")
-    print(f"   └── plots/ (7 visualization files)")
+    if plots:
+        print(f"   ├── assets/stroke_scaler.json (for Flutter)")
+        print(f"   └── plots/ (7 visualization files)")
+    else:
+        print(f"   └── assets/stroke_scaler.json (for Flutter)")
     print("\n🎉 Model is ready for deployment in your Flutter app!")
     print("="*70)
     
     return model, metrics
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Train the stroke risk model')
+    parser.add_argument('--plots', action='store_true',
+                        help='Also render the analysis/training/evaluation plots into plots/')
+    parser.add_argument('--cv-folds', type=int, default=0,
+                        help='Run stratified K-fold cross-validation (folds in parallel) before training')
+    args = parser.parse_args()
+    
     # Run with all improvements enabled
     model, metrics = train_stroke_model(
         use_smote=True,
-        use_feature_engineering=True
+        use_feature_engineering=True,
+        plots=args.plots,
+        cv_folds=args.cv_folds
     )
\ No newline at end of file
@@ -2,51 +2,51 @@ import tensorflow as tf
 import numpy as np
 import cv2
 
-def make_gradcam_heatmap(img_array, model, last_conv_layer_name="Conv_1"):
+def build_gradcam_model(model, last_conv_layer_name="Conv_1"):
     """
-    Generates a Grad-CAM heatmap for a given image and model.
+    Builds a model that maps input image -> last conv layer -> output predictions.
+    Build it once and reuse it for every make_gradcam_heatmap call.
     """
-    # 1. Create a model that maps input image -> last conv layer -> output predictions
-    grad_model = tf.keras.models.Model(
+    return tf.keras.models.Model(
         [model.inputs], 
         [model.get_layer(last_conv_layer_name).output, model.output]
     )
 
-    # 2. Compute Gradients
+def make_gradcam_heatmap(img_batch, grad_model):
+    """
+    Generates Grad-CAM heatmaps for a batch of images (B, H, W, C) -> (B, h, w), using a
+    model from build_gradcam_model. Pure TF ops (returns a tensor), so it can be wrapped
+    in a tf.function and stays on-device until the caller needs it.
+    """
+    # 1. Compute Gradients (each image w.r.t. its own top class)
     with tf.GradientTape() as tape:
-        last_conv_layer_output, preds = grad_model(img_array)
-        pred_index = tf.argmax(preds[0])
-        class_channel = preds[:, pred_index]
+        last_conv_layer_output, preds = grad_model(img_batch)
+        pred_index = tf.argmax(preds, axis=1)
+        class_channel = tf.gather(preds, pred_index, batch_dims=1)
 
     # Gradient of the output class with regard to the feature map
     grads = tape.gradient(class_channel, last_conv_layer_output)
 
-    # 3. Global Average Pooling of gradients
-    pooled_grads = tf.reduce_mean(grads, axis=(0, 1, 2))
+    # 2. Global Average Pooling of gradients, per image
+    pooled_grads = tf.reduce_mean(grads, axis=(1, 2))
 
-    # 4. Multiply feature map by "how important this channel is"
-    last_conv_layer_output = last_conv_layer_output[0]
-    heatmap = last_conv_layer_output @ pooled_grads[..., tf.newaxis]
-    heatmap = tf.squeeze(heatmap)
+    # 3. Multiply feature map by "how important this channel is"
+    heatmap = tf.einsum('bhwc,bc->bhw', last_conv_layer_output, pooled_grads)
 
-    # 5. Normalize the heatmap
-    heatmap = tf.maximum(heatmap, 0) / tf.math.reduce_max(heatmap)
-    return heatmap.numpy()
+    # 4. Normalize each heatmap
+    heatmap = tf.maximum(heatmap, 0) / tf.math.reduce_max(heatmap, axis=(1, 2), keepdims=True)
+    return heatmap
 
 def process_heatmap_overlay(original_img, heatmap):
     """
     Overlays the heatmap on the original image and returns base64.
     """
-    # Rescale heatmap to 0-255
-    heatmap = np.uint8(255 * heatmap)
-    
-    # Colorize
-    heatmap = cv2.applyColorMap(heatmap, cv2.COLORMAP_JET)
-    
-    # Resize to match original image (224x224)
-    heatmap = cv2.resize(heatmap, (224, 224))
+    # Resize the small heatmap to match original image (224x224) first, interpolating the
+    # scalar map rather than blended JET colors; then rescale to 0-255 and colorize
+    heatmap = cv2.resize(heatmap, (224, 224), interpolation=cv2.INTER_LINEAR)
+    heatmap = cv2.applyColorMap(np.uint8(255 * heatmap), cv2.COLORMAP_JET)
     
-    # Superimpose (Original image must be 0-255 uint8)
-    superimposed_img = heatmap * 0.4 + original_img
+    # Superimpose (Original image must be 0-255 uint8); one saturating uint8 blend
+    superimposed_img = cv2.addWeighted(heatmap, 0.4, original_img, 1.0, 0)
     
-    return superimposed_img
\ No newline at end of file
+    return superimposed_img